@@ -13,6 +13,10 @@ import yaml
 
 CFG_PATH = Path.home() / 'shopping_list_cfg.yml'
 KEY_PATH = Path.home() / 'shopping_list_key.json'
+CACHE_DIR = Path.home() / '.shopping_list_cache'
+PANTRY_PATH = Path.home() / 'shopping_list_pantry.db'
+PACKAGES_PATH = Path.home() / 'shopping_list_packages.yml'
+PRICES_PATH = Path.home() / 'shopping_list_prices.yml'
 DAYS = {}
 LOG_STRING = io.StringIO()
 
@@ -35,6 +39,23 @@ DEFAULTS = {
     'filename':'shopping_list',
     'output_dir': '~/Desktop',
     'mobile':False,
+    'cache_size_mb':50,
+    'metrics_file':'',
+    'metrics_port':0,
+    'prefetch':True,
+    'prefetch_workers':2,
+    'requests_per_minute':60,
+    'meal_sections':['Breakfast', 'Lunch', 'Snack', 'Dinner'],
+    'skip_rules':[{'day':'Monday', 'meal':'Lunch'}],
+    'batch_tolerance':0.05,
+    'batch_trim':False,
+    'batch_max_short':0.5,
+    'perishable_types':['meat', 'dairy', 'produce'],
+    'store_layouts':{},
+    'store_layout':'',
+    'nutrient_columns':{},
+    'shopping_trips':[],
+    'shelf_life':{'meat':3, 'dairy':7, 'produce':5},
 }
 
 def build_days():
@@ -83,6 +104,35 @@ def get_bool(name):
     with open(CFG_PATH, 'rb') as y_file:
         return yaml.load(y_file, yaml.Loader)[name]
 
+def get_value(name):
+    """
+    Retrieves any value in the config by name.
+
+    Parameters
+    ----------
+    name : str
+        Name of the setting.
+    """
+    with open(CFG_PATH, 'rb') as y_file:
+        return yaml.load(y_file, yaml.Loader)[name]
+
+def set_value(name, value):
+    """
+    Changes any value in the config by name.
+
+    Parameters
+    ----------
+    name : str
+        Name of the setting.
+    value : object
+        The new value.
+    """
+    with open(CFG_PATH, 'rb') as y_file:
+        yaml_dict = yaml.load(y_file, yaml.Loader)
+    yaml_dict[name] = value
+    with open(CFG_PATH, 'w') as y_file:
+        yaml.dump(yaml_dict, y_file, yaml.Dumper)
+
 def check_config():
     """Verifies the config is ok to use."""
     if CFG_PATH.exists():
@@ -6,12 +6,14 @@ import sys
 from functools import partial
 import os
 import subprocess
+import time
 from pathlib import Path
 
 from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import (
     QApplication,
     QAction,
+    QActionGroup,
     QButtonGroup,
     QDialog,
     QGroupBox,
@@ -30,7 +32,7 @@ from PyQt5.QtWidgets import (
     QWidget,
 )
 from PyQt5.QtGui import QTextCursor
-from PyQt5.QtCore import QThread
+from PyQt5.QtCore import QThread, QTimer
 import yaml
 
 import shopping_list
@@ -41,6 +43,11 @@ from shopping_list import (
     workers,
 )
 from shopping_list.dynamic_sheet import DynamicSheet
+from shopping_list.groups import StoreLayout
+from shopping_list.prices import PriceTable
+from shopping_list.result_cache import load_results, save_results
+from shopping_list.results import ShoppingResults
+from shopping_list.writer import ListWriter
 
 class OptionalDisplay(QDialog):
     """
@@ -83,8 +90,10 @@ class MainWidget(QMainWindow):
         self.wid_already_haves = None
         self.wid_sheet_names = None
         self.dynamic_sheet = None
-        self._shopping_list = {}
-        self._recipes = {}
+        self._results = None
+        self.list_writer = None
+        self.out_file = None
+        self.store_layout = StoreLayout.from_config(cfg_dict['store_layout'])
         self.make_menu(cfg_dict)
         #Name of the file.
         self.file_name = QLineEdit()
@@ -99,6 +108,8 @@ class MainWidget(QMainWindow):
         self.shopping_worker = None
         self.mon_thread = None
         self.string_worker = None
+        self.prefetch_thread = None
+        self.prefetch_worker = None
         #Contains sheet names and sets.
         self.generate_list_but = QPushButton('Generate List')
         self.generate_list_but.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Fixed)
@@ -129,6 +140,49 @@ class MainWidget(QMainWindow):
         #Set main.
         self.setCentralWidget(central_widget)
         self.resize(550, self.height())
+        #Load the saved build once the window is up.
+        QTimer.singleShot(0, lambda: self.results)
+        if cfg_dict['prefetch'] and shopping_list.check_keyfile():
+            self.start_prefetch(cfg_dict)
+
+    @property
+    def results(self):
+        """
+        Results of the last build, loaded from the saved build
+        the first time they are needed.
+        """
+        if self._results is None:
+            saved = load_results(builder.UREG)
+            if saved is None:
+                saved = ShoppingResults()
+            else:
+                self.status.append(f'Loaded saved list built {saved.created_str()}')
+            saved.prices = PriceTable.load(builder.UREG)
+            self.results = saved
+        return self._results
+
+    @results.setter
+    def results(self, new_results):
+        if self._results is not None:
+            self._results.unsubscribe(self.save_build)
+        self._results = new_results
+        #Edits are saved so the next start opens the edited list.
+        if new_results is not None:
+            new_results.subscribe(self.save_build)
+
+    def save_build(self, _patch=None):
+        """
+        Saves the current results for the next start.
+
+        Parameters
+        ----------
+        _patch : Patch, optional, default=None
+            The change that triggered the save, unused.
+        """
+        try:
+            save_results(self._results)
+        except OSError as exc:
+            self.status.append(f'Unable to save results {exc}')
 
     def reset_sheet_group_layout(self):
         """Resets the sheets layout if renamed."""
@@ -208,9 +262,11 @@ class MainWidget(QMainWindow):
         #File Menu
         open_sheet_act = QAction('Open Shopping List', self)
         open_dynamic_sheet_act = QAction('Open Dynamic Shopping List', self)
+        rerender_act = QAction('Re-render Shopping List', self)
         file_menu = self.menuBar().addMenu('File')
         file_menu.addAction(open_sheet_act)
         file_menu.addAction(open_dynamic_sheet_act)
+        file_menu.addAction(rerender_act)
         #Edit Menu
         already_have_act = QAction('Already Haves', self)
         edit_menu = self.menuBar().addMenu('Edit')
@@ -221,18 +277,34 @@ class MainWidget(QMainWindow):
         threaded_act = QAction('Threaded', self)
         threaded_act.setCheckable(True)
         threaded_act.setChecked(cfg_dict['threaded'])
+        prefetch_act = QAction('Prefetch Sheets', self)
+        prefetch_act.setCheckable(True)
+        prefetch_act.setChecked(cfg_dict['prefetch'])
         mobile_act = QAction('Mobile', self)
         mobile_act.setCheckable(True)
         mobile_act.setChecked(cfg_dict['mobile'])
+        #Store Menu
+        store_menu = self.menuBar().addMenu('Store')
+        store_group = QActionGroup(self)
+        for store_name in ['', *sorted(cfg_dict['store_layouts'])]:
+            store_act = QAction(store_name or 'Alphabetical', self)
+            store_act.setCheckable(True)
+            store_act.setChecked(store_name == cfg_dict['store_layout'])
+            store_act.triggered.connect(partial(self.change_store, store_name))
+            store_group.addAction(store_act)
+            store_menu.addAction(store_act)
         dev_menu = self.menuBar().addMenu('Developer Options')
         dev_menu.addAction(threaded_act)
+        dev_menu.addAction(prefetch_act)
         dev_menu.addAction(mobile_act)
         #Tie signals.
         open_sheet_act.triggered.connect(self.open_shopping_list)
         open_dynamic_sheet_act.triggered.connect(self.open_dynamic_sheet)
+        rerender_act.triggered.connect(self.rerender_shopping_list)
         already_have_act.triggered.connect(self.edit_already_haves)
         sheet_act.triggered.connect(self.edit_sheets)
         threaded_act.toggled.connect(partial(shopping_list.change_bool, 'threaded', threaded_act))
+        prefetch_act.toggled.connect(partial(shopping_list.change_bool, 'prefetch', prefetch_act))
         mobile_act.toggled.connect(partial(shopping_list.change_bool, 'mobile', mobile_act))
 
     def open_shopping_list(self):
@@ -240,6 +312,8 @@ class MainWidget(QMainWindow):
         Tries to open the shopping list if the path exists.
         """
         shop_file = self.get_outfile()
+        if not shop_file.exists() and self.results:
+            self.rerender_shopping_list()
         if not shop_file.exists():
             QMessageBox.information(self, 'Open File', f'{shop_file} does not exist!')
             return
@@ -260,7 +334,7 @@ class MainWidget(QMainWindow):
         Tries to open the dynamic sheet if one is currently active from a generate sheet
         or possibly loadable from the output text results.
         """
-        if not any(self._shopping_list):
+        if not self.results:
             generate_but = QPushButton('Generate')
             generate_but.clicked.connect(self.make_shopping_list)
             msg = 'Must have generated a sheet, generate one now?'
@@ -271,12 +345,46 @@ class MainWidget(QMainWindow):
             if result == QMessageBox.Yes:
                 self.make_shopping_list(self.open_dynamic_sheet)
             return
-        self.dynamic_sheet = DynamicSheet(
-            self,
-            self._shopping_list,
-            self._recipes)
+        self.dynamic_sheet = DynamicSheet(self, self.results, self.store_layout)
         self.dynamic_sheet.open()
 
+    def change_store(self, store_name):
+        """
+        Switches the aisle order of the outputs, the current
+        list is rewritten without rebuilding it.
+
+        Parameters
+        ----------
+        store_name : str
+            Name of the store layout, empty for alphabetical.
+        """
+        shopping_list.set_value('store_layout', store_name)
+        self.store_layout = StoreLayout.from_config(store_name)
+        if self.list_writer is not None:
+            self.list_writer.layout = self.store_layout
+            self.list_writer.save()
+
+    def rerender_shopping_list(self):
+        """
+        Rewrites the output file from the current results
+        without fetching anything from google.
+        """
+        if not self.results:
+            QMessageBox.information(self, 'Re-render', 'Must have generated a sheet first!')
+            return
+        out_file = self.get_outfile(save_cfg=True)
+        if not out_file.parent.exists():
+            self.status.setText(f'Output dir {out_file.parent} does not exist!')
+            return
+        start = time.perf_counter()
+        if self.list_writer is None:
+            self.list_writer = ListWriter(self.results, out_file, layout=self.store_layout)
+        self.list_writer.output_file = out_file
+        self.list_writer.render()
+        self.list_writer.save()
+        elapsed = (time.perf_counter() - start)*1000
+        self.status.append(f'Re-rendered {out_file} in {elapsed:.1f} ms')
+
     def check_for_keyfile(self):
         """
         Validates there is a key to connect to sheets.
@@ -373,10 +481,11 @@ class MainWidget(QMainWindow):
 
         with open(shopping_list.CFG_PATH, 'rb') as y_file:
             cfg_dict = yaml.load(y_file, yaml.Loader)
-        ignored = already_have.get_ignored()
+        ignored = already_have.get_ignored(builder.UREG)
         self.build_string_monitor()
         self.generate_list_but.setEnabled(False)
         out_file = self.get_outfile(save_cfg=True)
+        self.out_file = out_file
         if not out_file.parent.exists():
             self.status.setText(f'Output dir {out_file.parent} does not exist!')
             return
@@ -389,9 +498,31 @@ class MainWidget(QMainWindow):
             self.shop_thread.started.connect(self.shopping_worker.run)
             self.shop_thread.start()
         else:
-            food_items, recipes = builder.build(sheet_data, out_file, ignored)
+            food_items, recipes = None, None
+            try:
+                food_items, recipes = builder.build(sheet_data, out_file, ignored)
+            except Exception: #pylint: disable=broad-except
+                builder.get_logger().exception('Building the shopping list failed')
             self.all_done(food_items, recipes, fn_callback)
 
+    def start_prefetch(self, cfg_dict):
+        """
+        Downloads the configured sheets into the tab cache on
+        a thread while the user picks days.
+
+        Parameters
+        ----------
+        cfg_dict : dict
+            The configuration settings.
+        """
+        self.prefetch_thread = QThread()
+        self.prefetch_worker = workers.PrefetchWorker(
+            list(cfg_dict['sheets']), cfg_dict['prefetch_workers'])
+        self.prefetch_worker.moveToThread(self.prefetch_thread)
+        self.prefetch_thread.started.connect(self.prefetch_worker.run)
+        self.prefetch_worker.finished.connect(self.prefetch_thread.quit)
+        self.prefetch_thread.start()
+
     def build_string_monitor(self):
         """
         Creates the thread for the string worker
@@ -411,15 +542,21 @@ class MainWidget(QMainWindow):
 
         Parameters
         ----------
-        food_items : dict
-            Dictionary of food items.
-        recipes : dict
-            Recipes.
+        food_items : dict or None
+            Dictionary of food items, None if the build failed.
+        recipes : dict or None
+            Recipes, None if the build failed.
         fn_callback : func, optional, default=None
             If provided will be the last thing called.
         """
-        self._shopping_list = food_items
-        self._recipes = recipes
+        failed = food_items is None
+        if failed:
+            self.status.append('Building the shopping list failed, see the log')
+        else:
+            self.results = ShoppingResults(
+                food_items, recipes, prices=PriceTable.load(builder.UREG))
+            #Keeps the output file in sync with edits from the dynamic sheet.
+            self.list_writer = ListWriter(self.results, self.out_file, layout=self.store_layout)
         if self.string_worker:
             self.string_worker.alive = False
         self.mon_thread.quit()
@@ -427,7 +564,7 @@ class MainWidget(QMainWindow):
         self.shop_thread.quit()
         self.shop_thread.wait()
         self.generate_list_but.setEnabled(True)
-        if fn_callback:
+        if fn_callback and not failed:
             fn_callback()
 
 def main():
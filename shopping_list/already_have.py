@@ -19,6 +19,8 @@ from PyQt5.QtWidgets import (
 import yaml
 
 from shopping_list import CFG_PATH
+from shopping_list.matcher import AlreadyHaveMatcher
+from shopping_list.pantry import Pantry
 
 def write_names(names):
     """
@@ -44,24 +46,30 @@ def get_names():
     with open(CFG_PATH, 'rb') as y_file:
         return yaml.load(y_file, yaml.Loader)['names']
 
-def get_ignored():
+def get_ignored(units=None):
     """
-    Builds the ignored set from the config file.
-    Case insensitive is preserved by always loading
+    Builds the ignored matcher from the config file.
+    Case insensitive is preserved by always matching
     the names in as lowercase.
 
+    Parameters
+    ----------
+    units : UnitRegistry, optional, default=None
+        If provided, used to recognize quantity entries.
+
     Returns
     =======
-    set
-        The already have names that should be ignored.
+    AlreadyHaveMatcher
+        Matches the already have names that should be ignored.
     """
-    return set([name.lower() for name, use in get_names().items() if use])
+    return AlreadyHaveMatcher([name for name, use in get_names().items() if use], units)
 
 class AlreadyHave(QDialog):
     """
     Widget that allows manipulation of the underlying
     ini file and can set and remove different names
-    to be ignored.
+    to be ignored. Amounts recorded in the pantry are
+    listed below the names and can be removed too.
 
     """
 
@@ -87,7 +95,19 @@ class AlreadyHave(QDialog):
             else:
                 new_item.setData(Qt.CheckStateRole, Qt.Unchecked)
             self.already_haves.addItem(new_item)
+        self.pantry = Pantry()
+        self._pantry_removed = []
+        pantry_remove_act = QAction('Remove from Pantry?', self)
+        self.pantry_items = QListWidget()
+        self.pantry_items.setContextMenuPolicy(Qt.ActionsContextMenu)
+        self.pantry_items.addAction(pantry_remove_act)
+        self.pantry_items.itemDoubleClicked.connect(self.prompt_pantry_remove)
+        for name, qty, unit in self.pantry.items():
+            new_item = QListWidgetItem(f'{name} - {qty:g} {unit}')
+            new_item.setData(Qt.UserRole, name)
+            self.pantry_items.addItem(new_item)
         #Signals.
+        pantry_remove_act.triggered.connect(self.remove_pantry_item)
         modify_act.triggered.connect(self.modify_name)
         remove_act.triggered.connect(self.remove_name)
         self.create_new.clicked.connect(self.new_item)
@@ -96,13 +116,16 @@ class AlreadyHave(QDialog):
         #Checkboxes.
         layout = QGridLayout(self)
         msg = 'Add new items to be ignored (case-insensitive)\n'
+        msg += 'Patterns like *spice*, category:spices or 500 g rice work too\n'
         msg += 'Check or uncheck items to enable them as ignored\n'
         msg += 'Right click and delete or double click and answer prompt\n'
         layout.addWidget(QLabel(msg),         0, 0, 1, 2)
         layout.addWidget(self.create_new,     1, 1)
         layout.addWidget(self.already_haves,  2, 0, 1, 2)
-        layout.addWidget(self.save_and_close, 3, 0)
-        layout.addWidget(self.cancel_but,     3, 1)
+        layout.addWidget(QLabel('Pantry, subtracted from every build'), 3, 0, 1, 2)
+        layout.addWidget(self.pantry_items,   4, 0, 1, 2)
+        layout.addWidget(self.save_and_close, 5, 0)
+        layout.addWidget(self.cancel_but,     5, 1)
 
     def prompt_actions(self):
         """
@@ -191,10 +214,37 @@ class AlreadyHave(QDialog):
         item = self.already_haves.takeItem(row)
         del item
 
+    def prompt_pantry_remove(self):
+        """
+        For mobile.
+        """
+        item = self.pantry_items.currentItem()
+        result = QMessageBox.question(
+            self,
+            item.data(Qt.UserRole),
+            'Remove from Pantry?',
+            QMessageBox.Yes | QMessageBox.No)
+        if result == QMessageBox.Yes:
+            self.remove_pantry_item()
+
+    def remove_pantry_item(self):
+        """
+        Removes the current pantry entry, the pantry is only
+        changed on save.
+        """
+        row = self.pantry_items.currentRow()
+        if row < 0:
+            return
+        item = self.pantry_items.takeItem(row)
+        self._pantry_removed.append(item.data(Qt.UserRole))
+
     def accept(self):
         """
-        Saves the cfg to the file.
+        Saves the cfg to the file and removes the pantry
+        entries that were taken out.
         """
+        for name in self._pantry_removed:
+            self.pantry.remove(name)
         names = {}
         for row in range(self.already_haves.count()):
             item = self.already_haves.item(row)
@@ -0,0 +1,130 @@
+"""
+Works out how many whole batches of each recipe to make
+for every recipe at once, optionally dropping the last batch
+of a recipe when it would mostly be spoiled leftovers.
+"""
+import numpy as np
+
+import shopping_list
+
+def plan_batches(servings, rec_per_serv, tolerance=0.05):
+    """
+    Integer batch counts for the requested servings.
+
+    Parameters
+    ----------
+    servings : array_like
+        Servings requested of each recipe.
+    rec_per_serv : array_like
+        Recipes in one serving of each recipe.
+    tolerance : float, optional, default=0.05
+        Batches over a whole number that still round down,
+        so float noise doesn't add a whole batch.
+
+    Returns
+    -------
+    np.ndarray, np.ndarray, np.ndarray
+        Needed batches as floats, whole batches and the
+        leftover servings of each recipe.
+    """
+    servings = np.asarray(servings, dtype=float)
+    rec_per_serv = np.asarray(rec_per_serv, dtype=float)
+    needed = servings * rec_per_serv
+    #You always need at least one batch.
+    batches = np.maximum(np.ceil(needed - tolerance), 1).astype(int)
+    leftover = batches / rec_per_serv - servings
+    return needed, batches, leftover
+
+def perishable_share(recipes, perishable_types):
+    """
+    Number of perishable ingredients of each recipe that
+    another planned recipe also uses.
+
+    Parameters
+    ----------
+    recipes : list
+        The planned recipes.
+    perishable_types : collection
+        Lower case food types that spoil.
+
+    Returns
+    -------
+    np.ndarray
+    """
+    users = {}
+    for recipe in recipes:
+        for ing in recipe.ingredients:
+            if ing.food_type in perishable_types:
+                users.setdefault(ing.name, set()).add(recipe.name)
+    return np.array([
+        sum(len(users.get(ing.name, ())) > 1 for ing in recipe.ingredients
+            if ing.food_type in perishable_types)
+        for recipe in recipes
+    ], dtype=int)
+
+def trim_batches(needed, batches, rec_per_serv, shared, max_short=0.5):
+    """
+    Drops the last batch of each recipe that shares a
+    perishable ingredient with another recipe when that
+    leaves the recipe at most max_short servings short.
+    Every recipe is trimmed on its own, this is a simple rule
+    and doesn't weigh the leftovers of the recipes together.
+
+    Parameters
+    ----------
+    needed : np.ndarray
+        Needed batches from plan_batches.
+    batches : np.ndarray
+        Whole batches from plan_batches.
+    rec_per_serv : array_like
+        Recipes in one serving of each recipe.
+    shared : np.ndarray
+        Shared perishable ingredients from perishable_share.
+    max_short : float, optional, default=0.5
+        Most servings a recipe may come up short.
+
+    Returns
+    -------
+    np.ndarray
+        The trimmed whole batches.
+    """
+    rec_per_serv = np.asarray(rec_per_serv, dtype=float)
+    short = (needed - (batches - 1)) / rec_per_serv
+    trim = (shared > 0) & (batches > 1) & (short <= max_short)
+    return batches - trim.astype(int)
+
+def assign_batches(planned, cur_logger=None):
+    """
+    Sets the batches and leftover servings of every planned
+    recipe from the configured tolerance, trimming batches
+    if batch_trim is set.
+
+    Parameters
+    ----------
+    planned : list
+        Tuples of recipe and requested servings.
+    cur_logger : logging.Logger, optional, default=None
+        Receives a message for every trimmed batch.
+    """
+    if not planned:
+        return
+    recipes = [recipe for recipe, _ in planned]
+    servings = np.array([serv for _, serv in planned], dtype=float)
+    rec_per_serv = np.array([recipe.rec_per_serv for recipe in recipes], dtype=float)
+    needed, batches, leftover = plan_batches(
+        servings, rec_per_serv, shopping_list.get_value('batch_tolerance'))
+    if shopping_list.get_value('batch_trim'):
+        perishable = {f_type.lower() for f_type in shopping_list.get_value('perishable_types')}
+        shared = perishable_share(recipes, perishable)
+        trimmed = trim_batches(
+            needed, batches, rec_per_serv, shared, shopping_list.get_value('batch_max_short'))
+        if cur_logger is not None:
+            for recipe, old, new in zip(recipes, batches, trimmed):
+                if new != old:
+                    msg = f'Making {new} batches of {recipe.name} instead of {old} to save perishables'
+                    cur_logger.info(msg)
+        batches = trimmed
+        leftover = batches / rec_per_serv - servings
+    for recipe, count, left in zip(recipes, batches, leftover):
+        recipe.batches = int(count)
+        recipe.leftover = float(left)
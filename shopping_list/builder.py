@@ -2,25 +2,55 @@
 Generates a text file of shopping list items based
 on the sheets created on google drive for Food.
 """
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import copy
-import datetime as dt
 import logging
 from pathlib import Path
+import time
 
 import gspread
+from gspread.exceptions import APIError, SpreadsheetNotFound
 import pandas as pd
 from pint import UnitRegistry
 
 import shopping_list
 from shopping_list import SHEET_COLS, LOG_STRING
-from shopping_list.elements import Recipe, Food, ChosenItem, day_shortstr
+from shopping_list.batching import assign_batches
+from shopping_list.catalog import open_catalog, sync_catalog
+from shopping_list.elements import Recipe, Food, ChosenItem
+from shopping_list.groups import StoreLayout
+from shopping_list.matcher import AlreadyHaveMatcher
+from shopping_list.metrics import METRICS, start_http_server
+from shopping_list.normalize import merge_on_hand, normalize_foods, subtract_on_hand
+from shopping_list.nutrition import NutritionRollup
+from shopping_list.packages import PackageTable
+from shopping_list.pantry import Pantry
+from shopping_list.prices import PriceTable
+from shopping_list.result_cache import save_results
+from shopping_list.results import ShoppingResults
+from shopping_list.rules import MealRules
+from shopping_list.scheduler import (
+    PRIORITY_CATALOG, PRIORITY_PREFETCH, get_scheduler)
+from shopping_list.schema import MASTER_SCHEMA, PLAN_SCHEMA
+from shopping_list.tab_cache import get_cache, get_revision, read_values
+from shopping_list.trips import TripPlanner, trip_file
+from shopping_list.writer import ListWriter, write_bulk
 
 UREG = UnitRegistry()
 UREG.load_definitions(str(Path(__file__).parent / 'unit_def.txt'))
 
-def load_food_plan(worksheet, used_days):
+#Spreadsheet holding the catalog and the tabs read from it.
+CATALOG_SHEET = 'Food List'
+#Schema limiting the read of each tab, None reads the whole tab.
+CATALOG_TABS = {'master':MASTER_SCHEMA, 'recipes':None, 'base foods':None}
+
+#One target of build_households, already_have and pantry may be None.
+Household = namedtuple('Household', 'name sheet_data output_file already_have pantry')
+
+def load_food_plan(worksheet, used_days, cache=None):
     """
-    Creates data frames by days for a worksheet.
+    Reads the day tabs of a worksheet one at a time.
 
     Parameters
     ----------
@@ -28,23 +58,91 @@ def load_food_plan(worksheet, used_days):
         The worksheet to read the days from.
     used_days : tuple
         Desired days from the sheet.
+    cache : TabCache, optional, default=None
+        If provided, unchanged tabs are read from the cache.
 
-    Returns
-    -------
-    dict
-        Dictionary by day of pandas data frames.
+    Yields
+    ------
+    datetime.date, list
+        The day and the rows of its tab.
     """
     str_days = {day.strftime('%A').lower():day for day in used_days}
-    days = {}
     if worksheet is None:
-        return days
-    for sheet in worksheet:
+        return
+    revision = None
+    if cache:
+        revision = get_revision(worksheet)
+    scheduler = get_scheduler()
+    for sheet in scheduler.call(worksheet.worksheets):
         sheet_name = sheet.title.lower()
         sheet_day = str_days.get(sheet_name.lower())
         if sheet_day:
-            data = sheet.get_all_values()
-            days[sheet_day] = pd.DataFrame(data)
-    return days
+            if cache:
+                data = cache.get_values(worksheet, sheet, revision, schema=PLAN_SCHEMA)
+            else:
+                data = read_values(sheet, PLAN_SCHEMA)
+            yield sheet_day, data
+    if cache:
+        cache.flush()
+
+def aggregate_plans(tabs, cur_logger, items=None, rules=None, nutrition=None):
+    """
+    Updates the chosen items from tabs as they arrive, so
+    only one tab is held at a time.
+
+    Each tab is converted once by PLAN_SCHEMA, so the rows
+    below only see typed values and bad cells are reported
+    once per column instead of once per row.
+
+    Parameters
+    ----------
+    tabs : iterable
+        Tuples of sheet name, day and the rows of the tab,
+        usually the stream_plans generator.
+    cur_logger : logging.Logger
+        Logger to report problem columns to.
+    items : dict, optional, default=None
+        Chosen items to add to, a new dict by default.
+    rules : MealRules, optional, default=None
+        Meals to skip, defaults to the configured rules.
+    nutrition : NutritionRollup, optional, default=None
+        If provided, the servings of each tab are added to it.
+
+    Returns
+    -------
+    dict
+        ChosenItems by name.
+    """
+    if items is None:
+        items = {}
+    if rules is None:
+        rules = MealRules.from_config()
+    for sheet_name, day, rows in tabs:
+        plan = PLAN_SCHEMA.load_columns(rows, cur_logger, f'{sheet_name} - {day} -')
+        names = plan['name']
+        qtys = plan['qty']
+        unit_types = plan['unit_type']
+        serv_grams = plan['serv_grams']
+        METRICS.rows_parsed.inc(len(names))
+        keep = (names != '') & qtys.notna() & (qtys != 0) & unit_types.notna()
+        keep &= rules.keep_mask(sheet_name, day, names)
+        grams_rows = unit_types == 'grams'
+        keep &= ~grams_rows | serv_grams.notna()
+        if nutrition:
+            servings = qtys[keep].where(~grams_rows[keep], qtys[keep] / serv_grams[keep])
+            nutrition.add_tab(sheet_name, day, names[keep], servings.to_numpy())
+        for name, qty, unit_type, grams in zip(
+                names[keep], qtys[keep], unit_types[keep], serv_grams[keep]):
+            item = items.get(name)
+            if item is None:
+                item = items[name] = ChosenItem(name)
+            item.sheets.add(sheet_name)
+            item.days.add(day)
+            if unit_type == 'grams':
+                item.add_grams(qty, grams)
+            else:
+                item.add_servings(qty)
+    return items
 
 def build_food_from_days(user_days, cur_logger):
     """
@@ -52,73 +150,23 @@ def build_food_from_days(user_days, cur_logger):
 
     Parameters
     ----------
-    days : tuple
-        Named dictionaries containing days for each user.
+    user_days : dict
+        Dictionaries of tab rows or data frames by day for
+        each sheet name.
+    cur_logger : logging.Logger
+        Logger to report problem columns to.
 
     Returns
     -------
     dict
-        Dictionary by days of extracted data.
+        ChosenItems by name.
     """
-    items = {}
-    #Aliasing numbers to values to help.
-    skip_monday_lunch = False
-    for sheet_name, days in user_days.items():
-        for day, food_sheet in days.items():
-            cur_day = day.strftime('%a')
-            for row, food_row in food_sheet.iterrows():
-                log_msg = f'{sheet_name} - {day} - row {row} -'
-                name = food_row[SHEET_COLS['A']]
-                qty_str = food_row[SHEET_COLS['B']]
-                if cur_day == 'Mon':
-                    if name == 'Lunch':
-                        skip_monday_lunch = True
-                    elif name == 'Snack':
-                        skip_monday_lunch = False
-                if name == '' or qty_str == '':
-                    continue
-                if skip_monday_lunch:
-                    continue
-                try:
-                    qty = float(qty_str)
-                    unit_type = food_row[SHEET_COLS['C']]
-                    serv_weight_as_grams = food_row[SHEET_COLS['N']]
-                except KeyError as key_exc:
-                    msg = f'{log_msg} Failed to retrieve values {key_exc}'
-                    cur_logger.warning(msg)
-                    continue
-                except ValueError:
-                    msg = f'{log_msg} Unable to convert qty {qty_str}'
-                    cur_logger.warning(msg)
-                    continue
-                #Gurantees Item is available.
-                if name and qty:
-                    new_item = False
-                    item = items.get(name)
-                    if item is None:
-                        item = ChosenItem(name)
-                        new_item = True
-                    item.sheets.add(sheet_name)
-                    item.days.add(day)
-                    if unit_type == 'grams':
-                        if serv_weight_as_grams == '':
-                            continue
-                        try:
-                            serv_weight_as_grams = float(serv_weight_as_grams)
-                        except ValueError:
-                            msg = f'Failed to convert {name} serv_weight (g) {serv_weight_as_grams}'
-                            cur_logger.exception(item.exc_str(msg))
-                            continue
-                        item.add_grams(qty, serv_weight_as_grams)
-                    elif unit_type == 'servings':
-                        item.add_servings(qty)
-                    else:
-                        msg = f'Unrecognized unit_type {unit_type} for {name}'
-                        cur_logger.warning(item.exc_str(msg))
-                        continue
-                    if new_item:
-                        items[name] = item
-    return items
+    tabs = (
+        (sheet_name, day, rows)
+        for sheet_name, days in user_days.items()
+        for day, rows in days.items()
+    )
+    return aggregate_plans(tabs, cur_logger)
 
 def load_recipes(recipe_df, raw_df):
     """
@@ -166,6 +214,7 @@ def load_recipes(recipe_df, raw_df):
                 except ValueError:
                     msg = f'Failed to convert {serv_str} or {num_serv_str} on {ing_name}'
                     logger.warning(msg)
+                    METRICS.conversion_failures.inc()
                     continue
                 serv_unit = raw_ing_series['Serving Unit']
                 amount = serv_qty * UREG(serv_unit)
@@ -183,15 +232,22 @@ def load_recipes(recipe_df, raw_df):
         recipes[recipe_name] = cur_recipe
     return recipes
 
-def load_food_list(wks):
+def load_food_list(wks, cache=None, revision=None):
     """
     Loads the active items and recipes
     and returns their information as a dictionary.
+    The binary catalog is exported again when the revision
+    changed since its last export.
 
     Parameters
     ----------
     wks : gspread.models.Spreadsheet
         Worksheet to read data from.
+    cache : TabCache, optional, default=None
+        If provided, unchanged tabs are read from the cache.
+    revision : str, optional, default=None
+        Revision of the Food List, fetched when a cache is
+        given without one.
 
     Returns
     dict, dict
@@ -201,20 +257,30 @@ def load_food_list(wks):
     master_df = None
     recipe_df = None
     raw_df = None
-    for sheet in wks:
+    if cache and revision is None:
+        revision = get_revision(wks, PRIORITY_CATALOG)
+    scheduler = get_scheduler()
+    for sheet in scheduler.call(wks.worksheets, priority=PRIORITY_CATALOG):
         title = sheet.title.lower()
+        if title not in CATALOG_TABS:
+            continue
+        schema = CATALOG_TABS[title]
+        if cache:
+            data = cache.get_values(wks, sheet, revision, PRIORITY_CATALOG, schema)
+        else:
+            data = read_values(sheet, schema, PRIORITY_CATALOG)
         if title == 'master':
-            data = sheet.get_all_values()
-            master_df = pd.DataFrame(data)
-            master_df = master_df.set_index(master_df[0])
+            master_df = MASTER_SCHEMA.load(data, logger, 'Food List -')
+            master_df = master_df.set_index(master_df['name'])
         elif title == 'recipes':
-            data = sheet.get_all_values()
             recipe_df = pd.DataFrame(data)
         elif title == 'base foods':
-            data = sheet.get_all_values()
+            data = list(data)
             header = data.pop(0)
             raw_df = pd.DataFrame(data, columns=header)
             raw_df = raw_df.set_index(raw_df['Name'])
+    if cache:
+        cache.flush()
     if master_df is None:
         logger.exception('Missing master dataframe from food list')
         return None, {}
@@ -225,36 +291,38 @@ def load_food_list(wks):
         logger.exception('Missing base foods dataframe.')
         return None, {}
     recipes = load_recipes(recipe_df, raw_df)
+    if revision:
+        try:
+            sync_catalog(master_df, raw_df, revision)
+        except (OSError, KeyError) as exc:
+            msg = f'Unable to write the binary catalog {exc}'
+            logger.warning(msg)
     return master_df, recipes
 
 def add_food(new_food, all_food, already_have, ignored):
     """
     Adds food to all_food caring about things they already
-    have and updating ignored if so.
+    have and updating ignored if so. Contributions are kept
+    separate until normalize_foods combines them.
 
     Parameters
     ----------
     new_food : Food
         Food Item to add to the all_food.
     all_food : dict
-        All the food currently in the shopping list.
-    already_have : set
+        Lists of Food contributions by name.
+    already_have : AlreadyHaveMatcher
         Things to ignore.
     ignored : dict
-        Currently ignored items.
+        Lists of ignored Food contributions by name.
     """
-    if new_food.name.lower() in already_have:
-        if new_food.name in ignored:
-            ignored[new_food.name] += new_food.amount
-        else:
-            ignored[new_food.name] = new_food.amount
+    if already_have.ignores(new_food):
+        ignored.setdefault(new_food.name, []).append(new_food)
         return
-    if new_food.name in all_food:
-        all_food[new_food.name] += new_food
-    else:
-        all_food[new_food.name] = new_food
+    all_food.setdefault(new_food.name, []).append(new_food)
 
-def create_shopping_list(items, master_df, recipes, already_have):
+def create_shopping_list(items, master_df, recipes, already_have, pantry=None, packages=None,
+        catalog=None):
     """
     Builds the shopping list based on the items provided.
 
@@ -266,8 +334,17 @@ def create_shopping_list(items, master_df, recipes, already_have):
         Contains all of the food information.
     recipes : dict
         Dictionary of recipes.
-    already_have : set
-        If provided, will skip items that we know we have.
+    already_have : AlreadyHaveMatcher or set
+        If provided, will skip items that we know we have
+        and subtract amounts we partially have.
+    pantry : Pantry, optional, default=None
+        If provided, amounts in the pantry are subtracted
+        from the totals and recipes in it are skipped.
+    packages : PackageTable, optional, default=None
+        If provided, foods are rounded up to whole packages.
+    catalog : Catalog, optional, default=None
+        If provided, chosen foods are looked up in the mapped
+        catalog instead of master_df, it must be current.
 
     Returns
     -------
@@ -276,104 +353,264 @@ def create_shopping_list(items, master_df, recipes, already_have):
         units appended to them.
     """
     logger = logging.getLogger(__name__)
+    if not isinstance(already_have, AlreadyHaveMatcher):
+        already_have = AlreadyHaveMatcher(already_have or (), UREG)
+    on_hand = already_have.on_hand(UREG)
+    if pantry is not None:
+        on_hand = merge_on_hand(on_hand, pantry.on_hand(UREG))
     all_food = {}
     #Grab a list of food names to build a list of needed recipes.
     food_names = list(items.keys())
     ignored = {}
     ignored_recipes = []
     used_recipes = {}
+    planned = []
     for name in food_names:
         #Dont look for it later in master
         if name in recipes:
             recipe = recipes[name]
             chosen_item = items.pop(name)
             recipe.days |= chosen_item.days
-            if recipe.name.lower() in already_have:
+            if recipe.name in already_have or recipe.name.lower() in on_hand:
                 ignored_recipes.append(recipe)
                 continue
             used_recipes[recipe.name] = recipe
-            item_servings = chosen_item.total_servings()
-            num_recipes = item_servings * recipe.rec_per_serv
-            #If there are more servings requested then the
-            #recipes (unit) servings then bump it up to another
-            #set of servings for that recipe (make 2 recipes instead of 1.)
-            servings_per_recipe = 1/recipe.rec_per_serv
-            #You always need at least one recipe.
-            if item_servings < servings_per_recipe:
-                num_recipes = 1
-            elif item_servings > servings_per_recipe:
-                remain = item_servings % servings_per_recipe
-                if remain >= 1:
-                    num_recipes += 1
-            #Make the number of recipes an integer.
-            num_recipes = int(num_recipes)
-            for rec_ing in recipe.ingredients:
-                new_food = copy.copy(rec_ing)
-                new_food.days |= chosen_item.days
-                #Ensure the food is set to the number of
-                #requested recipes.
-                new_food *= num_recipes
-                add_food(new_food, all_food, already_have, ignored)
+            planned.append((recipe, chosen_item))
+    #Whole batches for every recipe at once.
+    assign_batches([(recipe, item.total_servings()) for recipe, item in planned], logger)
+    for recipe, chosen_item in planned:
+        for rec_ing in recipe.ingredients:
+            new_food = copy.copy(rec_ing)
+            new_food.days |= chosen_item.days
+            #Ensure the food is set to the number of
+            #requested recipes.
+            new_food *= recipe.batches
+            add_food(new_food, all_food, already_have, ignored)
     #Now grab all remaining food items from the master df. Report any missing items
     #to the user.
     for chosen_name, chosen_item in items.items():
-        if chosen_name not in master_df.index:
+        if catalog is not None:
+            master_row = catalog.master_row(chosen_name)
+        else:
+            master_row = master_df.loc[chosen_name] if chosen_name in master_df.index else None
+        if master_row is None:
             msg = f'{chosen_name} cant be found in master list!'
             logger.exception(chosen_item.exc_str(msg))
+            METRICS.master_misses.inc()
             continue
-        master_series = master_df.loc[chosen_name]
         total_g = chosen_item.total_grams()
         total_s = chosen_item.total_servings()
         try:
-            new_food = Food.from_masterlist(master_series, total_g, UREG)
+            if catalog is not None:
+                new_food = Food.from_catalog(master_row, total_g, UREG)
+            else:
+                new_food = Food.from_masterlist(master_row, total_g, UREG)
         except ValueError:
             msg = f'Failed to convert {chosen_name} from master list'
             logger.exception(chosen_item.exc_str(msg))
+            METRICS.conversion_failures.inc()
+            continue
         #Update the days this food is needed.
         new_food.days |= chosen_item.days
         new_food *= total_s
         add_food(new_food, all_food, already_have, ignored)
+    #Combine every contribution per food in one pass.
+    all_food = normalize_foods(all_food, master_df, UREG, logger)
+    ignored = normalize_foods(ignored, master_df, UREG, logger)
+    subtract_on_hand(all_food, ignored, on_hand, master_df, UREG, logger)
+    METRICS.ignored_items.inc(len(ignored) + len(ignored_recipes))
+    if packages is not None:
+        packages.round_up(all_food.values())
     #Alert the user that we are ignoring these items.
-    for food_name, amount in ignored.items():
-        msg = f'Assuming already have {amount:.2f} of {food_name}'
+    for food_name, food in ignored.items():
+        msg = f'Assuming already have {food.amount:.2f} of {food_name}'
         logger.info(msg)
     for recipe in ignored_recipes:
         msg = f'Assuming already made recipe {recipe.name}'
         logger.info(msg)
     return all_food, used_recipes
 
-def build_groups(food_items):
+def export_metrics(logger):
     """
-    Takes a list of Food items and creates a dictionary
-    organized by food_type. Blank food types will be appended
-    to the end as a No Category.
+    Publishes the build metrics to the configured file and
+    starts the configured HTTP endpoint.
 
     Parameters
     ----------
-    food_items : dict
-        Input dict of Food items.
+    logger : logging.Logger
+        Logger for export failures.
+    """
+    try:
+        metrics_port = shopping_list.get_value('metrics_port')
+        if metrics_port:
+            start_http_server(int(metrics_port))
+        metrics_file = shopping_list.get_value('metrics_file')
+        if metrics_file:
+            METRICS.write_textfile(metrics_file)
+    except OSError as exc:
+        msg = f'Unable to export metrics {exc}'
+        logger.warning(msg)
+
+def get_logger():
+    """
+    Retrieves the builder logger, attaching the LOG_STRING
+    handler the first time.
 
     Returns
     -------
-    dict
-        Organized by group name (food type), and the food
-        items in that group.
+    logging.Logger
     """
-    groups = {}
-    no_group = []
-    for food_item in food_items.values():
-        if food_item.food_type == '':
-            no_group.append(food_item)
+    logger = logging.getLogger(__name__)
+    logger.setLevel(logging.DEBUG)
+    if LOG_STRING and not logger.hasHandlers():
+        stream_handle = logging.StreamHandler(LOG_STRING)
+        stream_handle.flush()
+        stream_handle.setLevel(logging.DEBUG)
+        formatter = logging.Formatter('%(levelname)s - %(message)s')
+        stream_handle.setFormatter(formatter)
+        logger.addHandler(stream_handle)
+    return logger
+
+def stream_plans(google_sheets, sheet_data, cache, logger):
+    """
+    Opens each plan sheet and yields the requested day tabs
+    as they are read.
+
+    Parameters
+    ----------
+    google_sheets : gspread.Client
+        Authorized client.
+    sheet_data : dict
+        Names of the sheets and the days to use from them.
+    cache : TabCache
+        Cache of tab values.
+    logger : logging.Logger
+        Logger for progress and failures.
+
+    Yields
+    ------
+    str, datetime.date, list
+        Sheet name, day and rows for aggregate_plans.
+    """
+    for name, used_days in sheet_data.items():
+        if not any(used_days):
+            continue
+        msg = f'Grabbing food from {name}'
+        logger.info(msg)
+        try:
+            sheet = get_scheduler().call(google_sheets.open, name)
+        except SpreadsheetNotFound:
+            msg = f'Unable to find {name}!'
+            logger.error(msg)
+            METRICS.sheet_errors.inc()
             continue
-        if food_item.food_type not in groups:
-            groups[food_item.food_type] = []
-        groups[food_item.food_type].append(food_item)
-    if any(no_group):
-        groups['No Category'] = no_group
-    #Sort the groups
-    for group in groups:
-        groups[group].sort()
-    return groups
+        except APIError:
+            #Retries ran out, fail instead of building an incomplete list.
+            METRICS.sheet_errors.inc()
+            raise
+        METRICS.sheets_opened.inc()
+        for day, rows in load_food_plan(sheet, used_days, cache):
+            yield name, day, rows
+
+def _warm_spreadsheet(google_sheets, name, tab_schemas, cache):
+    """Reads the wanted tabs of one spreadsheet through the cache."""
+    scheduler = get_scheduler()
+    spreadsheet = scheduler.call(google_sheets.open, name, priority=PRIORITY_PREFETCH)
+    METRICS.sheets_opened.inc()
+    revision = get_revision(spreadsheet, PRIORITY_PREFETCH)
+    warmed = 0
+    for sheet in scheduler.call(spreadsheet.worksheets, priority=PRIORITY_PREFETCH):
+        title = sheet.title.lower()
+        if title in tab_schemas:
+            cache.get_values(spreadsheet, sheet, revision, PRIORITY_PREFETCH, tab_schemas[title])
+            warmed += 1
+    cache.flush()
+    return warmed
+
+def prefetch(sheet_names, max_workers=2, cache=None):
+    """
+    Warms the tab cache with the catalog and the day tabs of
+    every plan sheet so a following build reads them locally.
+
+    Parameters
+    ----------
+    sheet_names : list
+        Plan sheets to warm.
+    max_workers : int, optional, default=2
+        Spreadsheets downloaded at the same time.
+    cache : TabCache, optional, default=None
+        Cache to fill, defaults to the shared get_cache.
+
+    Returns
+    -------
+    int
+        Number of tabs read.
+    """
+    logger = get_logger()
+    if cache is None:
+        cache = get_cache()
+    google_sheets = gspread.authorize(shopping_list.get_credentials())
+    day_tabs = {day.strftime('%A').lower():PLAN_SCHEMA for day in shopping_list.DAYS.values()}
+    #The catalog is submitted first since every build needs it.
+    targets = [(CATALOG_SHEET, CATALOG_TABS)]
+    targets.extend((name, day_tabs) for name in sheet_names)
+    warmed = 0
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {
+            name:pool.submit(_warm_spreadsheet, google_sheets, name, tabs, cache)
+            for name, tabs in targets
+        }
+        for name, future in futures.items():
+            try:
+                warmed += future.result()
+            except Exception as exc: #pylint: disable=broad-except
+                msg = f'Unable to prefetch {name} {exc}'
+                logger.warning(msg)
+                METRICS.sheet_errors.inc()
+    msg = f'Prefetched {warmed} tabs'
+    logger.debug(msg)
+    return warmed
+
+def nutrition_file(output_file):
+    """
+    Path of the nutrition report next to a shopping list.
+
+    Returns
+    -------
+    Path
+    """
+    output_file = Path(output_file)
+    return output_file.with_name(f'{output_file.stem}_nutrition.txt')
+
+def write_trips(results, output_file, sheet_data, packages, layout, logger):
+    """
+    Writes one list per configured shopping trip next to the
+    whole list, nothing is written with a single trip.
+
+    Parameters
+    ----------
+    results : ShoppingResults
+        The whole shopping list.
+    output_file : Path
+        Path of the whole list.
+    sheet_data : dict
+        Names of the sheets and the days to use from them.
+    packages : PackageTable
+        Package sizes each trip is rounded to.
+    layout : StoreLayout or None
+        Aisle order of the outputs.
+    logger : logging.Logger
+        Logger for created files and foods that won't keep.
+    """
+    planner = TripPlanner.from_config(
+        {day for used_days in sheet_data.values() for day in used_days if day})
+    if not planner:
+        return
+    for trip, trip_results in planner.trip_results(results, packages, logger):
+        trip_output = trip_file(output_file, trip)
+        ListWriter(trip_results, trip_output, subscribe=False, layout=layout).save()
+        msg = f'File Created {trip_output} for the {trip:%a %m/%d} trip'
+        logger.info(msg)
 
 def build(sheet_data, output_file='shopping_list.txt', already_have=None):
     """
@@ -393,73 +630,138 @@ def build(sheet_data, output_file='shopping_list.txt', already_have=None):
     bool
         Whether or not the operation succeeded.
     """
-    logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
-    if LOG_STRING and not logger.hasHandlers():
-        stream_handle = logging.StreamHandler(LOG_STRING)
-        stream_handle.flush()
-        stream_handle.setLevel(logging.DEBUG)
-        formatter = logging.Formatter('%(levelname)s - %(message)s')
-        stream_handle.setFormatter(formatter)
-        logger.addHandler(stream_handle)
-    
-    google_sheets = gspread.authorize(shopping_list.get_credentials())
-    days = {}
-    for name, used_days in sheet_data.items():
-        if not any(used_days):
-            continue
-        msg = f'Grabbing food from {name}'
+    logger = get_logger()
+    METRICS.builds.inc()
+    try:
+        google_sheets = gspread.authorize(shopping_list.get_credentials())
+        cache = get_cache()
+        logger.info('Grabbing master food list')
+        with METRICS.stage('load_food_list'):
+            food_list = get_scheduler().call(
+                google_sheets.open, CATALOG_SHEET, priority=PRIORITY_CATALOG)
+            revision = get_revision(food_list, PRIORITY_CATALOG)
+            master_df, recipes = load_food_list(food_list, cache, revision)
+            METRICS.sheets_opened.inc()
+            packages = PackageTable.load(master_df, UREG)
+            prices = PriceTable.load(UREG)
+            layout = StoreLayout.from_config()
+            nutrition = NutritionRollup.from_config(master_df, recipes, UREG)
+        #Each tab is combined as soon as it is read.
+        with METRICS.stage('fetch_plans'):
+            food_by_day = aggregate_plans(
+                stream_plans(google_sheets, sheet_data, cache, logger), logger,
+                nutrition=nutrition)
+        logger.info('Creating the food list')
+        with METRICS.stage('create_list'):
+            catalog = open_catalog(revision)
+            try:
+                all_food, used_recipes = create_shopping_list(
+                    food_by_day, master_df, recipes, already_have, Pantry(), packages, catalog)
+            finally:
+                if catalog is not None:
+                    catalog.close()
+        with METRICS.stage('write'):
+            results = ShoppingResults(all_food, used_recipes, prices=prices)
+            ListWriter(results, output_file, subscribe=False, layout=layout).save()
+            if nutrition:
+                nutrition.save(nutrition_file(output_file))
+            write_trips(results, output_file, sheet_data, packages, layout, logger)
+        msg = f'File Created {output_file}'
         logger.info(msg)
         try:
-            sheet = google_sheets.open(name)
-        except Exception as exc:
-            print(exc)
-            msg = f'Unable to open {name}!'
-            logger.exception(msg)
-            continue
-        days[name] = load_food_plan(sheet, used_days)
-    logger.info('Grabbing master food list')
-    master_df, recipes = load_food_list(google_sheets.open('Food List'))
-    logger.info('Combining food sheets')
-    food_by_day = build_food_from_days(days, logger)
-    logger.info('Creating the food list')
-    all_food, used_recipes = create_shopping_list(food_by_day, master_df, recipes, already_have)
-    shopping_groups = build_groups(all_food)
-    today = dt.date.today()
-    with open(output_file, 'w+', encoding='utf-8') as s_file:
-        first_line = ''
-        second_line = ''
-        for day_num in range(7):
-            day = today + dt.timedelta(days=day_num)
-            end = ' '
-            if day_num == 6:
-                end = ''
-            day_block = f"{day.strftime('%A')}{end}"
-            first_line += day_block
-            date_block = day.strftime('%m/%d')
-            add_len = len(day_block) - len(date_block)
-            date_block += ' '*add_len
-            second_line += date_block
-        s_file.write(first_line + '\n')
-        s_file.write(second_line + '\n\n')
-        rec_header = 'Recipes Making this Week'
-        s_file.write(f'{rec_header}\n')
-        s_file.write(f"{'-'*len(rec_header)}\n")
-        for recipe in used_recipes.values():
-            s_file.write(f' - {recipe.name} - {day_shortstr(recipe.days)}\n')
-        s_file.write('\n')
-        group_names = sorted(shopping_groups)
-        if 'No Category' in group_names:
-            group_names.remove('No Category')
-            group_names.append('No Category')
-        for group_name in group_names:
-            #Make the first char upper case.
-            group_title = group_name[0].upper() + group_name[1:]
-            s_file.write(group_title + '\n')
-            s_file.write('-'*len(group_name) + '\n')
-            for food_item in shopping_groups[group_name]:
-                s_file.write(f'{food_item}\n')
-            s_file.write('\n')
-    msg = f'File Created {output_file}'
-    logger.info(msg)
+            save_results(results)
+        except OSError as exc:
+            msg = f'Unable to save results {exc}'
+            logger.warning(msg)
+    except Exception:
+        METRICS.build_errors.inc()
+        export_metrics(logger)
+        raise
+    METRICS.last_success = time.time()
+    export_metrics(logger)
     return all_food, used_recipes
+
+def _build_household(household, google_sheets, cache, master_df, recipes, packages, prices,
+        layout, logger, catalog=None):
+    """Fetches and aggregates one household against the shared catalog."""
+    nutrition = NutritionRollup.from_config(master_df, recipes, UREG)
+    with METRICS.stage('fetch_plans'):
+        food_by_day = aggregate_plans(
+            stream_plans(google_sheets, household.sheet_data, cache, logger), logger,
+            nutrition=nutrition)
+    #Recipes collect days while aggregating so each household gets its own.
+    all_food, used_recipes = create_shopping_list(
+        food_by_day, master_df, copy.deepcopy(recipes),
+        household.already_have, household.pantry, packages, catalog)
+    results = ShoppingResults(all_food, used_recipes, prices=prices)
+    ListWriter(results, household.output_file, subscribe=False, layout=layout).save()
+    if nutrition:
+        nutrition.save(nutrition_file(household.output_file))
+    write_trips(results, household.output_file, household.sheet_data, packages, layout, logger)
+    msg = f'File Created {household.output_file} for {household.name}'
+    logger.info(msg)
+    return results
+
+def build_households(households, bulk_file=None, max_workers=4):
+    """
+    Builds a shopping list for several households with one
+    catalog load, fetching and aggregating the households
+    concurrently.
+
+    Parameters
+    ----------
+    households : list
+        Household tuples, each writes its own output file.
+    bulk_file : Path, optional, default=None
+        If provided, a combined bulk purchase list with a
+        per household breakdown is written there.
+    max_workers : int, optional, default=4
+        Number of households built at the same time.
+
+    Returns
+    -------
+    dict
+        ShoppingResults by household name.
+    """
+    logger = get_logger()
+    google_sheets = gspread.authorize(shopping_list.get_credentials())
+    cache = get_cache()
+    METRICS.builds.inc()
+    logger.info('Grabbing master food list')
+    with METRICS.stage('load_food_list'):
+        food_list = get_scheduler().call(
+            google_sheets.open, CATALOG_SHEET, priority=PRIORITY_CATALOG)
+        revision = get_revision(food_list, PRIORITY_CATALOG)
+        master_df, recipes = load_food_list(food_list, cache, revision)
+        METRICS.sheets_opened.inc()
+        packages = PackageTable.load(master_df, UREG)
+        prices = PriceTable.load(UREG)
+        layout = StoreLayout.from_config()
+    all_results = {}
+    #One read only map is shared by every household.
+    catalog = open_catalog(revision)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            household.name:pool.submit(
+                _build_household, household, google_sheets, cache,
+                master_df, recipes, packages, prices, layout, logger, catalog)
+            for household in households
+        }
+        for name, future in futures.items():
+            try:
+                all_results[name] = future.result()
+            except Exception: #pylint: disable=broad-except
+                msg = f'Failed to build household {name}'
+                logger.exception(msg)
+                METRICS.build_errors.inc()
+    if catalog is not None:
+        catalog.close()
+    if bulk_file is not None:
+        with METRICS.stage('write'):
+            write_bulk(
+                all_results, bulk_file, master_df, UREG, logger, packages, prices, layout)
+        msg = f'File Created {bulk_file}'
+        logger.info(msg)
+    METRICS.last_success = time.time()
+    export_metrics(logger)
+    return all_results
@@ -0,0 +1,333 @@
+"""
+Compact binary copy of the Master and Base Foods
+catalogs that can be opened with mmap and shared between
+processes without parsing.
+
+Layout
+------
+header : magic, string count, master count, base count, the
+    string id of the Food List revision and the byte offset of
+    every section.
+strings : uint32 offsets followed by one utf-8 blob, every
+    name, unit and food type is stored once.
+master : fixed width rows of name id, serving qty, unit id,
+    grams and food type id.
+master_order : master row numbers sorted by name for lookups.
+base : fixed width rows of name id, serving qty, unit id and
+    food type id.
+base_order : base row numbers sorted by name for lookups.
+"""
+from collections import namedtuple
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from shopping_list import CACHE_DIR
+
+CATALOG_PATH = CACHE_DIR / 'catalog.bin'
+MAGIC = b'SLCAT002'
+HEADER = struct.Struct('<8s4I6Q')
+MASTER_DTYPE = np.dtype([
+    ('name', '<u4'),
+    ('qty', '<f8'),
+    ('unit', '<u4'),
+    ('grams', '<f8'),
+    ('food_type', '<u4'),
+])
+BASE_DTYPE = np.dtype([
+    ('name', '<u4'),
+    ('qty', '<f8'),
+    ('unit', '<u4'),
+    ('food_type', '<u4'),
+])
+
+MasterRow = namedtuple('MasterRow', 'name qty unit grams food_type')
+BaseRow = namedtuple('BaseRow', 'name qty unit food_type')
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+class _Interner():
+    """Assigns one id per distinct string."""
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def __call__(self, value):
+        value = str(value)
+        str_id = self.ids.get(value)
+        if str_id is None:
+            str_id = len(self.strings)
+            self.ids[value] = str_id
+            self.strings.append(value)
+        return str_id
+
+    def pack(self):
+        """
+        Packs the strings into an offset array and blob.
+
+        Returns
+        -------
+        bytes, bytes
+        """
+        encoded = [string.encode('utf-8') for string in self.strings]
+        offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+        offsets[1:] = np.cumsum([len(raw) for raw in encoded], dtype='<u8')
+        return offsets.tobytes(), b''.join(encoded)
+
+def _align(size):
+    return (size + 7) & ~7
+
+def export_catalog(master_df, raw_df, path=CATALOG_PATH, revision=''):
+    """
+    Writes the binary catalog from the Master and Base Foods
+    dataframes from load_food_list.
+
+    Parameters
+    ----------
+    master_df : pd.DataFrame
+        Typed Master sheet indexed by name, see
+        schema.MASTER_SCHEMA.
+    raw_df : pd.DataFrame
+        Base Foods sheet with a header row.
+    path : Path, optional, default=CATALOG_PATH
+        Output file, replaced atomically so open maps
+        stay valid.
+    revision : str, optional, default=''
+        Revision of the Food List the rows came from.
+
+    Returns
+    -------
+    Path
+        The written file.
+    """
+    intern = _Interner()
+    revision_id = intern(revision or '')
+    master = np.zeros(len(master_df), dtype=MASTER_DTYPE)
+    master['name'] = [intern(val) for val in master_df['name']]
+    master['qty'] = [_to_float(val) for val in master_df['serving_qty']]
+    master['unit'] = [intern(val) for val in master_df['serving_unit']]
+    master['grams'] = [_to_float(val) for val in master_df['grams']]
+    master['food_type'] = [intern(val) for val in master_df['food_type']]
+    base = np.zeros(len(raw_df), dtype=BASE_DTYPE)
+    base['name'] = [intern(val) for val in raw_df['Name']]
+    base['qty'] = [_to_float(val) for val in raw_df['Serving Qty']]
+    base['unit'] = [intern(val) for val in raw_df['Serving Unit']]
+    base['food_type'] = [intern(val) for val in raw_df['Food Type']]
+    names = intern.strings
+    master_order = np.array(
+        sorted(range(len(master)), key=lambda row: names[master['name'][row]]),
+        dtype='<u4')
+    base_order = np.array(
+        sorted(range(len(base)), key=lambda row: names[base['name'][row]]),
+        dtype='<u4')
+    offsets, blob = intern.pack()
+    sections = [offsets, blob, master.tobytes(), master_order.tobytes(),
+        base.tobytes(), base_order.tobytes()]
+    starts = []
+    position = _align(HEADER.size)
+    for section in sections:
+        starts.append(position)
+        position = _align(position + len(section))
+    header = HEADER.pack(MAGIC, len(names), len(master), len(base), revision_id, *starts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'wb') as c_file:
+        c_file.write(header)
+        for start, section in zip(starts, sections):
+            c_file.write(b'\0'*(start - c_file.tell()))
+            c_file.write(section)
+    os.replace(tmp_path, path)
+    return path
+
+class Catalog():
+    """
+    Read only view of a binary catalog. Columns are numpy
+    arrays over the mapped file so nothing is copied and the
+    pages are shared by every process reading it.
+
+    Parameters
+    ----------
+    path : Path, optional, default=CATALOG_PATH
+        The catalog file from export_catalog.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        with open(path, 'rb') as c_file:
+            self._map = mmap.mmap(c_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            self._map.close()
+            raise ValueError(f'{path} is not a shopping list catalog')
+        magic, n_strings, n_master, n_base, revision_id, *starts = HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f'{path} is not a shopping list catalog')
+        str_off, blob_off, master_off, m_order_off, base_off, b_order_off = starts
+        self._offsets = np.frombuffer(
+            self._map, dtype='<u4', count=n_strings + 1, offset=str_off)
+        self._blob_off = blob_off
+        self.master = np.frombuffer(
+            self._map, dtype=MASTER_DTYPE, count=n_master, offset=master_off)
+        self._master_order = np.frombuffer(
+            self._map, dtype='<u4', count=n_master, offset=m_order_off)
+        self.base = np.frombuffer(
+            self._map, dtype=BASE_DTYPE, count=n_base, offset=base_off)
+        self._base_order = np.frombuffer(
+            self._map, dtype='<u4', count=n_base, offset=b_order_off)
+        self.revision = self.string(revision_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Releases the map, arrays from it are invalid afterwards."""
+        self._offsets = self.master = self.base = None
+        self._master_order = self._base_order = None
+        self._map.close()
+
+    def string(self, str_id):
+        """
+        Decodes one interned string.
+
+        Parameters
+        ----------
+        str_id : int
+            Id from one of the string columns.
+
+        Returns
+        -------
+        str
+        """
+        start = self._blob_off + int(self._offsets[str_id])
+        end = self._blob_off + int(self._offsets[str_id + 1])
+        return self._map[start:end].decode('utf-8')
+
+    def _find(self, rows, order, name):
+        """Binary search of the sorted order by name."""
+        low, high = 0, len(order)
+        while low < high:
+            mid = (low + high) // 2
+            if self.string(rows['name'][order[mid]]) < name:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(order) and self.string(rows['name'][order[low]]) == name:
+            return int(order[low])
+        return None
+
+    def master_row(self, name):
+        """
+        Looks up a Master row by food name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the food.
+
+        Returns
+        -------
+        MasterRow or None
+            The row with decoded strings, None if missing.
+        """
+        row = self._find(self.master, self._master_order, name)
+        if row is None:
+            return None
+        rec = self.master[row]
+        return MasterRow(
+            self.string(rec['name']),
+            float(rec['qty']),
+            self.string(rec['unit']),
+            float(rec['grams']),
+            self.string(rec['food_type']))
+
+    def base_row(self, name):
+        """
+        Looks up a Base Foods row by name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the base food.
+
+        Returns
+        -------
+        BaseRow or None
+            The row with decoded strings, None if missing.
+        """
+        row = self._find(self.base, self._base_order, name)
+        if row is None:
+            return None
+        rec = self.base[row]
+        return BaseRow(
+            self.string(rec['name']),
+            float(rec['qty']),
+            self.string(rec['unit']),
+            self.string(rec['food_type']))
+
+    def __contains__(self, name):
+        return self._find(self.master, self._master_order, name) is not None
+
+def open_catalog(revision, path=CATALOG_PATH):
+    """
+    Opens the catalog if it was exported from a revision.
+
+    Parameters
+    ----------
+    revision : str
+        Current revision of the Food List.
+    path : Path, optional, default=CATALOG_PATH
+        The catalog file from export_catalog.
+
+    Returns
+    -------
+    Catalog or None
+        None if the file is missing, unreadable or from
+        another revision.
+    """
+    if not revision:
+        return None
+    try:
+        catalog = Catalog(path)
+    except (OSError, ValueError):
+        return None
+    if catalog.revision != revision:
+        catalog.close()
+        return None
+    return catalog
+
+def sync_catalog(master_df, raw_df, revision, path=CATALOG_PATH):
+    """
+    Exports the catalog unless it is already from revision.
+
+    Parameters
+    ----------
+    master_df : pd.DataFrame
+        Typed Master sheet indexed by name.
+    raw_df : pd.DataFrame
+        Base Foods sheet with a header row.
+    revision : str
+        Revision of the Food List the frames came from.
+    path : Path, optional, default=CATALOG_PATH
+        The catalog file.
+
+    Returns
+    -------
+    bool
+        Whether the catalog was written.
+    """
+    catalog = open_catalog(revision, path)
+    if catalog is not None:
+        catalog.close()
+        return False
+    export_catalog(master_df, raw_df, path, revision)
+    return True
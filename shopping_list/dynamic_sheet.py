@@ -1,188 +1,433 @@
-
 """
 Provides a dynamic view of the shopping list with
 some tied in features.
 """
+import bisect
 import os
 
-from functools import partial
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import (
+    QAbstractItemModel,
+    QModelIndex,
+    QSortFilterProxyModel,
+    Qt,
+)
 from PyQt5.QtWidgets import (
+    QAbstractItemView,
     QAction,
     QDialog,
-    QGroupBox,
-    QHBoxLayout,
-    QListWidget,
-    QListWidgetItem,
+    QInputDialog,
+    QLineEdit,
     QMessageBox,
     QPushButton,
-    QSizePolicy,
-    QScrollArea,
+    QTreeView,
     QVBoxLayout,
-    QWidget,
 )
 
 import shopping_list
-from shopping_list.already_have import write_names, get_names
-from shopping_list.builder import build_groups
+from shopping_list.elements import Food
+from shopping_list.groups import arrange, group_key
+from shopping_list.pantry import Pantry
+
+#Rows handed to the view each time it scrolls near the end of a group.
+FETCH_BATCH = 200
+
+class ShoppingModel(QAbstractItemModel):
+    """
+    Tree of group -> item for the dynamic sheet. The first
+    group holds the recipes and the rest are the food groups.
+    Children are materialized in batches as the view asks
+    for them so opening a long list costs the same as a
+    short one.
+
+    Parameters
+    ----------
+    groups : list
+        (key, title, items) tuples in display order, the
+        key is 'recipes' or the section of the foods.
+    parent : QObject, optional, default=None
+        Owner of the model.
+    section : func, optional, default=group_key
+        Group key of a food, StoreLayout.section when the
+        groups follow a store's aisles.
+    """
+
+    def __init__(self, groups, parent=None, section=group_key):
+        super().__init__(parent)
+        self.section = section
+        self._keys = [key for key, _, _ in groups]
+        self._groups = [(title, items) for _, title, items in groups]
+        self._loaded = [0]*len(groups)
+        self._labels = {}
+
+    def item(self, index):
+        """
+        Retrieves the Food or Recipe at an index.
+
+        Parameters
+        ----------
+        index : QModelIndex
+            Index in this model.
+
+        Returns
+        -------
+        Food, Recipe or None
+            None for group rows.
+        """
+        if not index.isValid() or index.internalId() == 0:
+            return None
+        return self._groups[index.internalId() - 1][1][index.row()]
+
+    def set_label(self, index, prefix):
+        """
+        Prefixes the display text of an item, like 'ignored'.
+
+        Parameters
+        ----------
+        index : QModelIndex
+            Index of the item.
+        prefix : str or None
+            Text to show before the name, None clears it.
+        """
+        item = self.item(index)
+        if item is None:
+            return
+        if prefix:
+            self._labels[item.name] = prefix
+        else:
+            self._labels.pop(item.name, None)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole])
+
+    def find(self, key, name):
+        """
+        Finds the index of an item by group key and name.
+
+        Parameters
+        ----------
+        key : str
+            Group key of the item.
+        name : str
+            Name of the item.
+
+        Returns
+        -------
+        QModelIndex
+            Invalid if the item isn't materialized.
+        """
+        if key not in self._keys:
+            return QModelIndex()
+        group_row = self._keys.index(key)
+        items = self._groups[group_row][1]
+        for row in range(self._loaded[group_row]):
+            if items[row].name == name:
+                return self.index(row, 0, self.index(group_row, 0))
+        return QModelIndex()
+
+    def apply(self, patch):
+        """
+        Updates just the rows touched by a results patch.
+
+        Parameters
+        ----------
+        patch : Patch
+            Change published by ShoppingResults.
+        """
+        key = 'recipes' if patch.kind == 'recipe' else self.section(patch.item)
+        index = self.find(key, patch.name)
+        if patch.op == 'remove':
+            self._labels[patch.name] = 'ignored'
+        elif patch.op == 'add':
+            self._labels.pop(patch.name, None)
+            if not index.isValid():
+                self.insert(key, patch.item)
+                return
+        if index.isValid():
+            self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.ToolTipRole])
+
+    def insert(self, key, item):
+        """
+        Inserts a new item at its sorted place in its group,
+        creating the group at the end if it's new.
+
+        Parameters
+        ----------
+        key : str
+            Group key of the item.
+        item : Food or Recipe
+            The new item.
+        """
+        if key not in self._keys:
+            row = len(self._groups)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._keys.append(key)
+            self._groups.append((key[0].upper() + key[1:], []))
+            self._loaded.append(0)
+            self.endInsertRows()
+        group_row = self._keys.index(key)
+        items = self._groups[group_row][1]
+        row = bisect.bisect_left([other.sort_key for other in items], item.sort_key)
+        if row >= self._loaded[group_row]:
+            items.insert(row, item)
+            return
+        self.beginInsertRows(self.index(group_row, 0), row, row)
+        items.insert(row, item)
+        self._loaded[group_row] += 1
+        self.endInsertRows()
+
+    def fetch_all(self):
+        """Materializes every row, used before filtering."""
+        for row in range(len(self._groups)):
+            parent = self.index(row, 0)
+            while self.canFetchMore(parent):
+                self.fetchMore(parent)
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        return self.createIndex(row, column, parent.row() + 1)
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        return self.createIndex(index.internalId() - 1, 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return len(self._groups)
+        if parent.internalId() == 0:
+            return self._loaded[parent.row()]
+        return 0
+
+    def columnCount(self, parent=QModelIndex()):
+        return 1
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return bool(self._groups)
+        if parent.internalId() == 0:
+            return bool(self._groups[parent.row()][1])
+        return False
+
+    def canFetchMore(self, parent):
+        if not parent.isValid() or parent.internalId() != 0:
+            return False
+        return self._loaded[parent.row()] < len(self._groups[parent.row()][1])
+
+    def fetchMore(self, parent):
+        if not self.canFetchMore(parent):
+            return
+        row = parent.row()
+        start = self._loaded[row]
+        end = min(start + FETCH_BATCH, len(self._groups[row][1]))
+        self.beginInsertRows(parent, start, end - 1)
+        self._loaded[row] = end
+        self.endInsertRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if index.internalId() == 0:
+            title, items = self._groups[index.row()]
+            if role == Qt.DisplayRole:
+                return f'{title} ({len(items)})'
+            return None
+        item = self.item(index)
+        if role == Qt.DisplayRole:
+            prefix = self._labels.get(item.name)
+            if prefix:
+                return f'{prefix} - {item.name}'
+            return item.name
+        if role == Qt.ToolTipRole and isinstance(item, Food):
+            return str(item)
+        if role == Qt.UserRole:
+            return item
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
 
 class DynamicSheet(QDialog):
     """
     Opens the Food Items from the created shopping
     list and presents them in a GUI. Allows some features
-    like 'Add to AlreadyHaves' which will update the already
-    haves with items to be ignored.
+    like 'Add to AlreadyHaves' which will record the items
+    in the pantry so they are subtracted next time.
 
     Parameters
     ----------
     parent : QWidget
         The parent widget that can be updated.
-    food_items : set
-        The food list back from the shopping list.
-    recipes : list
-        List of recipes in the food sheet.
+    results : ShoppingResults
+        The shopping list results, edits are made through
+        it and reflected back as they are published.
+    layout : StoreLayout, optional, default=None
+        If provided, groups follow the store's aisle order
+        like the output file.
     """
 
-    def __init__(self, parent, food_items, recipes):
+    def __init__(self, parent, results, layout=None):
         super().__init__(parent)
-        self.setWindowTitle('Dynamic Sheet')
+        title = f'Dynamic Sheet - built {results.created_str()}'
+        estimate = results.estimate()
+        if estimate:
+            title += f' - {estimate.format(estimate.total())}'
+        self.setWindowTitle(title)
         if os.name != 'nt':
             self.setWindowModality(Qt.WindowModal)
-        self._scroll = QScrollArea()
-        self.food_items = food_items
-        self.recipes = recipes
-        self.cur_group = None
-        self.shopping_groups = build_groups(self.food_items)
-        self.recipe_list = QListWidget()
-        ignore_recipe_act = QAction('Add to Already Have', self)
-        ignore_recipe_act.triggered.connect(self.ignore_recipe)
-        ignore_food_act = QAction('Add to Already Have', self)
-        ignore_food_act.triggered.connect(self.ignore_food)
-        #Build the recipe group.
-        list_widget = QWidget()
-        list_layout = QVBoxLayout(list_widget)
-        recipe_group = QGroupBox('Recipes')
-        layout = QVBoxLayout(recipe_group)
-        layout.addWidget(self.recipe_list)
-        list_policy = QSizePolicy(
-            QSizePolicy.Preferred,
-            QSizePolicy.MinimumExpanding)
-        for recipe in self.recipes.values():
-            recipe_item = QListWidgetItem()
-            recipe_item.setData(Qt.DisplayRole, recipe.name)
-            recipe_item.setData(Qt.UserRole, recipe)
-            self.recipe_list.addItem(recipe_item)
-            self.recipe_list.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-            self.recipe_list.setSizePolicy(list_policy)
-        self.recipe_list.setContextMenuPolicy(Qt.ActionsContextMenu)
-        self.recipe_list.addAction(ignore_recipe_act)
-        self.recipe_list.itemDoubleClicked.connect(self.double_click_recipe)
-        list_layout.addWidget(recipe_group)
-        self.food_lists = {}
-        group_names = sorted(self.shopping_groups)
-        if 'No Category' in group_names:
-            group_names.remove('No Category')
-            group_names.append('No Category')
-        for group_name in group_names:
+        self.results = results
+        self.pantry = Pantry()
+        groups = [('recipes', 'Recipes', list(self.results.recipes.values()))]
+        for group_name, foods in arrange(self.results.groups, layout):
             #Modify the group names to always have uppercase first letter.
             disp_name = group_name[0].upper() + group_name[1:]
-            food_group = QGroupBox(disp_name)
-            layout = QVBoxLayout(food_group)
-            food_list = QListWidget()
-            layout.addWidget(food_list)
-            self.food_lists[group_name] = food_list
-            for food_item in self.shopping_groups[group_name]:
-                new_item = QListWidgetItem()
-                new_item.setData(Qt.DisplayRole, food_item.name)
-                new_item.setData(Qt.UserRole, food_item)
-                food_list.addItem(new_item)
-            food_list.setContextMenuPolicy(Qt.ActionsContextMenu)
-            food_list.pressed.connect(partial(self.set_current_group, group_name))
-            food_list.addAction(ignore_food_act)
-            food_list.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-            food_list.setSizePolicy(list_policy)
-            food_list.itemDoubleClicked.connect(self.double_click_food)
-            list_layout.addWidget(food_group)
-        main_widget = QWidget()
-        main_layout = QHBoxLayout(main_widget)
-        main_layout.addWidget(list_widget)
-        main_layout.addSpacing(10)
-        self._scroll.setWidgetResizable(True)
-        self._scroll.setWidget(main_widget)
-        self._scroll.setSizePolicy(list_policy)
+            if estimate:
+                cost_str = estimate.format(estimate.group(foods))
+                if cost_str:
+                    disp_name += f' - {cost_str}'
+            groups.append((group_name, disp_name, list(foods)))
+        section = layout.section if layout is not None else group_key
+        self.model = ShoppingModel(groups, self, section)
+        self.results.subscribe(self.model.apply)
+        self.finished.connect(lambda _: self.results.unsubscribe(self.model.apply))
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
+        self.proxy.setRecursiveFilteringEnabled(True)
+        self.search = QLineEdit()
+        self.search.setPlaceholderText('Search')
+        self.search.textChanged.connect(self.filter_items)
+        self.tree = QTreeView()
+        self.tree.setModel(self.proxy)
+        self.tree.setHeaderHidden(True)
+        self.tree.setUniformRowHeights(True)
+        self.tree.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tree.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.tree.expandAll()
+        ignore_act = QAction('Add to Already Have', self)
+        ignore_act.triggered.connect(self.ignore_current)
+        pantry_act = QAction('Set Pantry Amount', self)
+        pantry_act.triggered.connect(self.set_pantry_amount)
+        self.tree.setContextMenuPolicy(Qt.ActionsContextMenu)
+        self.tree.addActions([ignore_act, pantry_act])
+        self.tree.doubleClicked.connect(self.double_click)
         main_layout = QVBoxLayout(self)
-        main_layout.addWidget(self._scroll)
+        main_layout.addWidget(self.search)
+        main_layout.addWidget(self.tree)
         close_but = QPushButton('Close')
         close_but.clicked.connect(self.accept)
         main_layout.addWidget(close_but)
         if shopping_list.get_bool('mobile'):
             self.resize(parent.size())
 
-    def double_click_recipe(self, item):
-        recipe = item.data(Qt.UserRole)
-        if recipe.name not in self.parent()._recipes:
-            return
-        result = QMessageBox.information(
-            self,
-            item.data(Qt.DisplayRole),
-            'Add to Already Have?',
-            QMessageBox.Yes | QMessageBox.No)
-        if result == QMessageBox.Yes:
-            self.add_to_already_haves(item)
-            self.parent()._recipes.pop(recipe.name)
+    def filter_items(self, text):
+        """
+        Filters the items by name, group titles stay visible
+        while they have a match.
+
+        Parameters
+        ----------
+        text : str
+            Text to search for.
+        """
+        if text:
+            self.model.fetch_all()
+        self.proxy.setFilterFixedString(text)
+        self.tree.expandAll()
+
+    def current_index(self):
+        """
+        Retrieves the selected source index.
+
+        Returns
+        -------
+        QModelIndex
+        """
+        return self.proxy.mapToSource(self.tree.currentIndex())
 
-    def double_click_food(self, item):
-        food = item.data(Qt.UserRole)
-        if food.name not in self.parent()._shopping_list:
+    def double_click(self, proxy_index):
+        index = self.proxy.mapToSource(proxy_index)
+        item = self.model.item(index)
+        if item is None or not self.is_active(item):
             return
         result = QMessageBox.information(
             self,
-            item.data(Qt.DisplayRole),
+            item.name,
             'Add to Already Have?',
             QMessageBox.Yes | QMessageBox.No)
         if result == QMessageBox.Yes:
-            self.add_to_already_haves(item)
-            self.parent()._shopping_list.pop(food.name)
+            self.add_to_already_haves(index)
 
-    def add_to_already_haves(self, item):
+    def is_active(self, item):
         """
-        Updates the item in already haves and turns the background
-        grey.
+        Whether the item is still part of the parent's results.
 
         Parameters
         ----------
-        item : QListWidgetItem
-            The item with the food or recipe.
+        item : Food or Recipe
+            The item to check.
+
+        Returns
+        -------
+        bool
         """
-        food = item.data(Qt.UserRole)
-        names = get_names()
-        names[food.name.lower()] = True
-        write_names(names)
-        item.setData(Qt.DisplayRole, f'ignored - {food.name}')
+        if isinstance(item, Food):
+            return item.name in self.results.foods
+        return item.name in self.results.recipes
 
-    def ignore_recipe(self):
+    def add_to_already_haves(self, index):
         """
-        Grabs the currently selected item and removes
-        it from parent recipes and adds it to already haves.
+        Records the whole amount of the item in the pantry
+        and removes it from the results, the entry is listed
+        in the Already Haves dialog where it can be removed.
+
+        Parameters
+        ----------
+        index : QModelIndex
+            Source index of the food or recipe.
         """
-        item = self.recipe_list.currentItem()
-        recipe = item.data(Qt.UserRole)
-        if recipe.name not in self.parent()._recipes:
-            return
-        self.add_to_already_haves(item)
-        self.parent()._recipes.pop(recipe.name)
+        item = self.model.item(index)
+        if isinstance(item, Food):
+            self.pantry.set_quantity(item.name, item.amount)
+            self.results.remove_food(item.name)
+        else:
+            self.pantry.set_amount(item.name, 1, 'recipe')
+            self.results.remove_recipe(item.name)
 
-    def ignore_food(self):
+    def ignore_current(self):
         """
-        Should try to ignore this food for the user.
+        Grabs the currently selected item and adds it to
+        already haves.
         """
-        item = self.food_lists[self.cur_group].currentItem()
-        food = item.data(Qt.UserRole)
-        if food.name not in self.parent()._shopping_list:
+        index = self.current_index()
+        item = self.model.item(index)
+        if item is None or not self.is_active(item):
             return
-        self.add_to_already_haves(item)
-        self.parent()._shopping_list.pop(food.name)
+        self.add_to_already_haves(index)
 
-    def set_current_group(self, group_name):
-        """When context menu requested, sets the current group its from."""
-        self.cur_group = group_name
+    def set_pantry_amount(self):
+        """
+        Prompts for the amount of the current food on hand
+        and stores it in the pantry.
+        """
+        index = self.current_index()
+        food = self.model.item(index)
+        if not isinstance(food, Food):
+            return
+        units = food.amount.units
+        qty, ok_pressed = QInputDialog.getDouble(
+            self,
+            food.name,
+            f'Amount on hand ({units}):',
+            0, 0, 1e6, 2)
+        if not ok_pressed:
+            return
+        self.pantry.set_amount(food.name, qty, str(units))
+        if qty >= food.amount.magnitude:
+            self.results.remove_food(food.name)
+        elif qty > 0:
+            self.model.set_label(index, f'have {qty:.2f}')
+        else:
+            self.model.set_label(index, None)
@@ -3,8 +3,12 @@ Defines the portions of the online google
 with items that we want for the sheet.
 """
 
+import functools
+import math
+import re
+import sys
+
 from pint import DimensionalityError
-from shopping_list import SHEET_COLS
 
 def day_shortstr(days, fmt='%a'):
     """
@@ -18,6 +22,43 @@ def day_shortstr(days, fmt='%a'):
     days = sorted(days)
     return f"({','.join([day.strftime(fmt) for day in days])})"
 
+@functools.lru_cache(maxsize=None)
+def lower_type(food_type):
+    """
+    Lowercases a food type once per distinct value, the
+    result is interned so groups compare by identity.
+
+    Parameters
+    ----------
+    food_type : str
+        Food type as written in the sheet.
+
+    Returns
+    -------
+    str
+    """
+    return sys.intern(food_type.lower())
+
+@functools.lru_cache(maxsize=None)
+def natural_key(name):
+    """
+    Builds a case-insensitive natural ordering key, so
+    'egg 2' sorts before 'Egg 10'. The name is kept last
+    to break ties between names that only differ by case.
+
+    Parameters
+    ----------
+    name : str
+        The name to order by.
+
+    Returns
+    -------
+    tuple
+    """
+    parts = re.split(r'(\d+)', name.casefold())
+    parts[1::2] = [int(part) for part in parts[1::2]]
+    return (tuple(parts), name)
+
 class Food():
     """
     An element of the list with a name and serving amt.
@@ -42,8 +83,12 @@ class Food():
         self.name = name
         self.amount = amount
         self.rec_unit = rec_unit
-        self.food_type = food_type.lower()
+        self.food_type = lower_type(food_type)
         self.days = set()
+        self.leftovers = []
+        #Whole packages to buy and their label, see PackageTable.
+        self.packages = None
+        self.sort_key = natural_key(name)
 
     @classmethod
     def from_masterlist(cls, series, total_g, ureg):
@@ -54,7 +99,8 @@ class Food():
         Parameters
         ----------
         series : pd.Series
-            Series for the new Food item from Master.
+            Typed row for the new Food item from Master,
+            see schema.MASTER_SCHEMA.
         total_g : float
             The total number of grams for the food from
             the chosen item if units are in grams.
@@ -67,21 +113,44 @@ class Food():
         Food
             The created food item.
         """
-        name = series[SHEET_COLS['A']]
-        qty_str = series[SHEET_COLS['F']]
-        food_unit = series[SHEET_COLS['G']]
-        grams_str = series[SHEET_COLS['H']]
-        food_type = series[SHEET_COLS['M']]
-        try:
-            food_qty = float(qty_str)
-        except ValueError as exc1:
-            msg = f'Failed to convert {name} {qty_str} qty {exc1}'
-            if total_g is None or total_g == 0:
-                raise ValueError(msg) from exc1
-            food_grams = float(grams_str)
-            food_qty = food_grams/total_g
+        name = series['name']
+        food_qty = series['serving_qty']
+        food_unit = series['serving_unit']
+        if math.isnan(food_qty):
+            if not total_g or math.isnan(series['grams']):
+                raise ValueError(f'Failed to convert {name} qty')
+            food_qty = series['grams']/total_g
         amount = food_qty * ureg(food_unit)
-        return cls(name, amount, food_unit, food_type)
+        return cls(name, amount, food_unit, series['food_type'])
+
+    @classmethod
+    def from_catalog(cls, row, total_g, ureg):
+        """
+        Builds the food item from a binary catalog row.
+
+        Parameters
+        ----------
+        row : catalog.MasterRow
+            Row for the new Food item from Catalog.master_row.
+        total_g : float
+            The total number of grams for the food from
+            the chosen item if units are in grams.
+        ureg : UnitRegistry
+            Provided to keep one instance of the units
+            registry alive.
+
+        Returns
+        -------
+        Food
+            The created food item.
+        """
+        food_qty = row.qty
+        if math.isnan(food_qty):
+            if total_g is None or total_g == 0 or math.isnan(row.grams):
+                raise ValueError(f'Failed to convert {row.name} qty')
+            food_qty = row.grams/total_g
+        amount = food_qty * ureg(row.unit)
+        return cls(row.name, amount, row.unit, row.food_type)
 
     def day_shortstr(self):
         """
@@ -96,16 +165,40 @@ class Food():
             return day_shortstr(self.days, '%d')
         return day_shortstr(self.days)
 
-    def __str__(self):
-        unit = self.amount
+    def display_amount(self):
+        """
+        Retrieves the amount in the recipe unit when it
+        converts, otherwise the amount as is.
+
+        Returns
+        -------
+        pint.Quantity
+        """
         try:
-            unit = self.amount.to(self.rec_unit)
+            return self.amount.to(self.rec_unit)
         except DimensionalityError:
-            pass
-        return f'{unit:.2f} {self.name} {self.day_shortstr()}'
+            return self.amount
+
+    def amount_str(self):
+        """
+        Formats the amount with any leftovers in other units.
+
+        Returns
+        -------
+        str
+            Like '2.00 cup + 1.00 can'.
+        """
+        extra = ''.join([f' + {left:.2f}' for left in self.leftovers])
+        return f'{self.display_amount():.2f}{extra}'
+
+    def __str__(self):
+        line = f'{self.amount_str()} {self.name} {self.day_shortstr()}'
+        if self.packages:
+            line += f' - buy {self.packages[0]} {self.packages[1]}'
+        return line
 
     def __lt__(self, other):
-        return self.name < other.name
+        return self.sort_key < other.sort_key
 
     def __copy__(self):
         return type(self)(self.name, self.amount, self.rec_unit, self.food_type)
@@ -142,7 +235,11 @@ class Recipe():
     def __init__(self, name, rec_per_serv, ingredients=None):
         self.name = name
         self.rec_per_serv = rec_per_serv
+        self.sort_key = natural_key(name)
         self.days = set()
+        #Set by batching.assign_batches.
+        self.batches = 0
+        self.leftover = 0.0
         self.ingredients = []
         if ingredients:
             self.ingredients = ingredients
@@ -150,6 +247,24 @@ class Recipe():
     def __str__(self):
         return f'{self.name} with {len(self.ingredients)} ingredients.'
 
+    def batch_str(self):
+        """
+        Describes the planned batches.
+
+        Returns
+        -------
+        str
+            Like 'x2, 1.50 servings left', empty if unplanned.
+        """
+        if not self.batches:
+            return ''
+        batch_str = f'x{self.batches}'
+        if self.leftover > 0.005:
+            batch_str += f', {self.leftover:.2f} servings left'
+        elif self.leftover < -0.005:
+            batch_str += f', {-self.leftover:.2f} servings short'
+        return batch_str
+
     def append(self, item):
         """
         Adds an item to ingredients.
@@ -0,0 +1,228 @@
+"""
+Organizes Food items into the food_type groups used by
+the output file and the dynamic sheet.
+"""
+import bisect
+
+import shopping_list
+
+NO_CATEGORY = 'No Category'
+
+def group_key(food_item):
+    """
+    Retrieves the group a food belongs in.
+
+    Parameters
+    ----------
+    food_item : Food
+        The food to group.
+
+    Returns
+    -------
+    str
+    """
+    return food_item.food_type or NO_CATEGORY
+
+class GroupIndex():
+    """
+    Foods bucketed by group and kept in natural order as
+    they are added, so reading a group never sorts.
+
+    Parameters
+    ----------
+    food_items : iterable, optional, default=()
+        Food items to start with.
+    """
+
+    def __init__(self, food_items=()):
+        self._keys = {}
+        self._foods = {}
+        for food_item in food_items:
+            self.add(food_item)
+
+    def add(self, food_item):
+        """
+        Inserts a food at its sorted position, replacing a
+        food with the same name.
+
+        Parameters
+        ----------
+        food_item : Food
+            The food to add.
+        """
+        group = group_key(food_item)
+        keys = self._keys.setdefault(group, [])
+        foods = self._foods.setdefault(group, [])
+        pos = bisect.bisect_left(keys, food_item.sort_key)
+        if pos < len(keys) and keys[pos] == food_item.sort_key:
+            foods[pos] = food_item
+            return
+        keys.insert(pos, food_item.sort_key)
+        foods.insert(pos, food_item)
+
+    def remove(self, food_item):
+        """
+        Removes a food, dropping its group once empty.
+
+        Parameters
+        ----------
+        food_item : Food
+            The food to remove.
+        """
+        group = group_key(food_item)
+        keys = self._keys.get(group)
+        if keys is None:
+            return
+        pos = bisect.bisect_left(keys, food_item.sort_key)
+        if pos == len(keys) or keys[pos] != food_item.sort_key:
+            return
+        keys.pop(pos)
+        self._foods[group].pop(pos)
+        if not keys:
+            self._keys.pop(group)
+            self._foods.pop(group)
+
+    def __getitem__(self, group):
+        return self._foods[group]
+
+    def __contains__(self, group):
+        return group in self._foods
+
+    def __iter__(self):
+        return iter(self._foods)
+
+    def __len__(self):
+        return len(self._foods)
+
+def group_order(shopping_groups, layout=None):
+    """
+    Orders group names alphabetically with No Category last.
+
+    Parameters
+    ----------
+    shopping_groups : GroupIndex or dict
+        Foods by group.
+    layout : StoreLayout, optional, default=None
+        If provided, groups follow the store's aisles.
+
+    Returns
+    -------
+    list
+        Group names in display order.
+    """
+    if layout is not None:
+        return sorted(shopping_groups, key=layout.group_rank)
+    group_names = sorted(shopping_groups)
+    if NO_CATEGORY in group_names:
+        group_names.remove(NO_CATEGORY)
+        group_names.append(NO_CATEGORY)
+    return group_names
+
+def arrange(shopping_groups, layout=None):
+    """
+    Sections of the output in display order.
+
+    Parameters
+    ----------
+    shopping_groups : GroupIndex or dict
+        Foods by group in natural order.
+    layout : StoreLayout, optional, default=None
+        If provided, groups follow the store's aisles and
+        overridden foods move to their aisle.
+
+    Returns
+    -------
+    list
+        (group name, foods) tuples.
+    """
+    if layout is None:
+        return [(name, shopping_groups[name]) for name in group_order(shopping_groups)]
+    return layout.arrange(shopping_groups)
+
+class StoreLayout():
+    """
+    Aisle order of a store. Ranks are computed once so
+    switching stores only re-sorts the group names.
+
+    Parameters
+    ----------
+    name : str
+        Name of the store.
+    aisles : list
+        Food types in the order they are walked.
+    foods : dict, optional, default=None
+        Food type aisle by food name, overriding the food's
+        own type.
+    """
+
+    def __init__(self, name, aisles, foods=None):
+        self.name = name
+        self._rank = {aisle.lower():rank for rank, aisle in enumerate(aisles)}
+        self.overrides = {food:aisle.lower() for food, aisle in (foods or {}).items()}
+
+    @classmethod
+    def from_config(cls, name=None):
+        """
+        Builds a configured layout.
+
+        Parameters
+        ----------
+        name : str, optional, default=None
+            Store name, defaults to the 'store_layout' setting.
+
+        Returns
+        -------
+        StoreLayout or None
+            None when no layout is chosen or it isn't defined.
+        """
+        if name is None:
+            name = shopping_list.get_value('store_layout')
+        profile = shopping_list.get_value('store_layouts').get(name) if name else None
+        if not profile:
+            return None
+        return cls(name, profile.get('aisles', []), profile.get('foods'))
+
+    def group_rank(self, group):
+        """
+        Sort key of a group, unlisted groups follow the aisles
+        alphabetically with No Category last.
+
+        Returns
+        -------
+        tuple
+        """
+        if group == NO_CATEGORY:
+            return (len(self._rank) + 1, group)
+        return (self._rank.get(group, len(self._rank)), group)
+
+    def section(self, food_item):
+        """
+        Group a food is shopped in at this store.
+
+        Returns
+        -------
+        str
+        """
+        return self.overrides.get(food_item.name) or group_key(food_item)
+
+    def arrange(self, shopping_groups):
+        """
+        Sections in aisle order, see arrange.
+
+        Returns
+        -------
+        list
+        """
+        sections = {name:shopping_groups[name] for name in shopping_groups}
+        if self.overrides:
+            moved = {}
+            for name, foods in sections.items():
+                if any(food.name in self.overrides for food in foods):
+                    sections[name] = [food for food in foods if self.section(food) == name]
+                    for food in foods:
+                        if self.section(food) != name:
+                            moved.setdefault(self.section(food), []).append(food)
+            for name, foods in moved.items():
+                sections[name] = sorted(list(sections.get(name, [])) + foods)
+        sections = {name:foods for name, foods in sections.items() if foods}
+        return [(name, sections[name]) for name in group_order(sections, self)]
@@ -0,0 +1,128 @@
+"""
+Compiles the already have entries once per build into a
+matcher that can check each food in constant time or
+one regex pass over the name.
+
+Entries
+-------
+salt : exact name, case-insensitive.
+*spice* : glob pattern on the name.
+category:spices : every food with that food type.
+500 g rice : already have that amount, only the rest
+    is added to the list.
+"""
+import fnmatch
+import re
+
+CATEGORY_PREFIX = 'category:'
+_QTY_RE = re.compile(r'^\s*(\d+(?:\.\d*)?|\.\d+)\s*([^\s\d]\S*)\s+(.+?)\s*$')
+_GLOB_CHARS = set('*?[')
+
+def parse_quantity(entry):
+    """
+    Splits a quantity entry like '500 g rice'.
+
+    Parameters
+    ----------
+    entry : str
+        The already have entry.
+
+    Returns
+    -------
+    tuple or None
+        (name, qty, unit) or None if there is no quantity.
+    """
+    match = _QTY_RE.match(entry)
+    if match is None:
+        return None
+    qty, unit, name = match.groups()
+    return name.lower(), float(qty), unit
+
+class AlreadyHaveMatcher():
+    """
+    Matches foods and recipes against already have entries.
+    Exact names and categories live in hash sets and every
+    glob is joined into a single regular expression.
+
+    Parameters
+    ----------
+    entries : iterable
+        The enabled already have entries.
+    units : container, optional, default=None
+        Known unit names, if provided a quantity entry is
+        only recognized when its unit is in it.
+    """
+
+    def __init__(self, entries, units=None):
+        self.names = set()
+        self.categories = set()
+        self.quantities = {}
+        globs = []
+        for entry in entries:
+            entry = entry.strip()
+            lowered = entry.lower()
+            if not lowered:
+                continue
+            if lowered.startswith(CATEGORY_PREFIX):
+                self.categories.add(lowered[len(CATEGORY_PREFIX):].strip())
+                continue
+            parsed = parse_quantity(entry)
+            if parsed and (units is None or parsed[2] in units):
+                name, qty, unit = parsed
+                self.quantities[name] = (qty, unit)
+                continue
+            if _GLOB_CHARS & set(lowered):
+                globs.append(fnmatch.translate(lowered))
+            else:
+                self.names.add(lowered)
+        self._pattern = None
+        if globs:
+            self._pattern = re.compile('|'.join(globs))
+
+    def __contains__(self, name):
+        """Checks a name against exact names and patterns."""
+        lowered = name.lower()
+        if lowered in self.names:
+            return True
+        if self._pattern is not None:
+            return self._pattern.match(lowered) is not None
+        return False
+
+    def __bool__(self):
+        return bool(self.names or self.categories or self.quantities or self._pattern)
+
+    def ignores(self, food):
+        """
+        Whether a food is fully ignored by name, pattern or
+        food type.
+
+        Parameters
+        ----------
+        food : Food
+            The food to check.
+
+        Returns
+        -------
+        bool
+        """
+        return food.food_type in self.categories or food.name in self
+
+    def on_hand(self, ureg):
+        """
+        Builds the partial amounts already on hand.
+
+        Parameters
+        ----------
+        ureg : UnitRegistry
+            Registry to build the amounts with.
+
+        Returns
+        -------
+        dict
+            Quantities by lowercase food name.
+        """
+        return {
+            name:qty * ureg(unit)
+            for name, (qty, unit) in self.quantities.items()
+            if unit in ureg
+        }
@@ -0,0 +1,279 @@
+"""
+Counters and stage timings for builds, exported in the
+Prometheus text format to a file or a small local HTTP
+endpoint so scheduled builds can be collected.
+"""
+import contextlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+from pathlib import Path
+import threading
+import time
+
+#Upper bounds in seconds for the stage duration buckets.
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+def _label_str(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{value}"' for key, value in labels)
+    return '{' + pairs + '}'
+
+class Counter():
+    """
+    Monotonic counter with optional labels.
+
+    Parameters
+    ----------
+    name : str
+        Metric name.
+    doc : str
+        Help text.
+    """
+
+    def __init__(self, name, doc):
+        self.name = name
+        self.doc = doc
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        """
+        Increments the counter.
+
+        Parameters
+        ----------
+        amount : float, optional, default=1
+            Amount to add.
+        labels : dict
+            Label values for this sample.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        """Current value for a set of labels."""
+        return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self):
+        """
+        Lines in the Prometheus text format.
+
+        Returns
+        -------
+        list
+        """
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values) or {(): 0}
+        for key, value in values.items():
+            lines.append(f'{self.name}{_label_str(key)} {value}')
+        return lines
+
+class Histogram():
+    """
+    Cumulative bucket histogram with optional labels.
+
+    Parameters
+    ----------
+    name : str
+        Metric name.
+    doc : str
+        Help text.
+    buckets : tuple, optional, default=DEFAULT_BUCKETS
+        Upper bounds of the buckets.
+    """
+
+    def __init__(self, name, doc, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """
+        Records one observation.
+
+        Parameters
+        ----------
+        value : float
+            The observed value.
+        labels : dict
+            Label values for this sample.
+        """
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0]*len(self.buckets), 0, 0.0]
+            for pos, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][pos] += 1
+            series[1] += 1
+            series[2] += value
+
+    def count(self, **labels):
+        """Number of observations for a set of labels."""
+        series = self._series.get(tuple(sorted(labels.items())))
+        return series[1] if series else 0
+
+    def render(self):
+        """
+        Lines in the Prometheus text format.
+
+        Returns
+        -------
+        list
+        """
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            all_series = {key:(list(counts), num, total) for key, (counts, num, total) in self._series.items()}
+        for key, (counts, num, total) in all_series.items():
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{_label_str(key + (("le", bound),))} {count}')
+            lines.append(f'{self.name}_bucket{_label_str(key + (("le", "+Inf"),))} {num}')
+            lines.append(f'{self.name}_sum{_label_str(key)} {total}')
+            lines.append(f'{self.name}_count{_label_str(key)} {num}')
+        return lines
+
+class BuildMetrics():
+    """
+    Every metric recorded while building a shopping list.
+    """
+
+    def __init__(self):
+        self.builds = Counter(
+            'shopping_list_builds_total', 'Builds started.')
+        self.build_errors = Counter(
+            'shopping_list_build_errors_total', 'Builds that raised an error.')
+        self.sheets_opened = Counter(
+            'shopping_list_sheets_opened_total', 'Spreadsheets opened from google.')
+        self.sheet_errors = Counter(
+            'shopping_list_sheet_errors_total', 'Spreadsheets that failed to open.')
+        self.request_retries = Counter(
+            'shopping_list_request_retries_total', 'Google requests retried by status code.')
+        self.rows_parsed = Counter(
+            'shopping_list_rows_parsed_total', 'Plan rows parsed.')
+        self.master_misses = Counter(
+            'shopping_list_master_misses_total', 'Chosen items missing from the master list.')
+        self.conversion_failures = Counter(
+            'shopping_list_conversion_failures_total', 'Quantities or units that failed to convert.')
+        self.ignored_items = Counter(
+            'shopping_list_ignored_items_total', 'Foods and recipes skipped as already had.')
+        self.stage_seconds = Histogram(
+            'shopping_list_stage_seconds', 'Duration of each build stage.')
+        self.last_success = 0.0
+
+    def all_metrics(self):
+        """
+        Every metric in export order.
+
+        Returns
+        -------
+        list
+        """
+        return [
+            self.builds,
+            self.build_errors,
+            self.sheets_opened,
+            self.sheet_errors,
+            self.request_retries,
+            self.rows_parsed,
+            self.master_misses,
+            self.conversion_failures,
+            self.ignored_items,
+            self.stage_seconds,
+        ]
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Times a block as a build stage.
+
+        Parameters
+        ----------
+        name : str
+            Label of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - start, stage=name)
+
+    def render(self):
+        """
+        Renders every metric in the Prometheus text format.
+
+        Returns
+        -------
+        str
+        """
+        lines = []
+        for metric in self.all_metrics():
+            lines.extend(metric.render())
+        lines.append('# HELP shopping_list_last_success_timestamp_seconds Last successful build.')
+        lines.append('# TYPE shopping_list_last_success_timestamp_seconds gauge')
+        lines.append(f'shopping_list_last_success_timestamp_seconds {self.last_success}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """
+        Writes the metrics for a textfile collector, replacing
+        the file atomically.
+
+        Parameters
+        ----------
+        path : Path
+            Output file, usually ending in .prom.
+        """
+        path = Path(path).expanduser()
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as m_file:
+            m_file.write(self.render())
+        os.replace(tmp_path, path)
+
+METRICS = BuildMetrics()
+_SERVER = None
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """Serves METRICS on /metrics."""
+
+    def do_GET(self): #pylint: disable=invalid-name
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = METRICS.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args): #pylint: disable=arguments-differ
+        pass
+
+def start_http_server(port, host='127.0.0.1'):
+    """
+    Serves the metrics on a local port from a daemon thread,
+    only the first call starts a server.
+
+    Parameters
+    ----------
+    port : int
+        Port to listen on.
+    host : str, optional, default='127.0.0.1'
+        Interface to bind.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+    """
+    global _SERVER #pylint: disable=global-statement
+    if _SERVER is None:
+        _SERVER = ThreadingHTTPServer((host, port), _MetricsHandler)
+        thread = threading.Thread(target=_SERVER.serve_forever, daemon=True)
+        thread.start()
+    return _SERVER
@@ -0,0 +1,238 @@
+"""
+Combines every contribution of a food into one amount
+in a single unit, converting whole arrays of amounts at
+once instead of one addition at a time.
+"""
+import copy
+from functools import partial
+
+import numpy as np
+from pint import DimensionalityError, UndefinedUnitError
+
+from shopping_list.metrics import METRICS
+
+def get_density(master_df, name, ureg):
+    """
+    Builds the grams per unit of a food from its Master
+    row (serving qty, unit and grams) so volumes and counts can be
+    bridged to mass.
+
+    Parameters
+    ----------
+    master_df : pd.DataFrame
+        Master food list indexed by name.
+    name : str
+        Name of the food.
+    ureg : UnitRegistry
+        The shared unit registry.
+
+    Returns
+    -------
+    pint.Quantity or None
+        Grams per serving unit or None if unknown.
+    """
+    if master_df is None or name not in master_df.index:
+        return None
+    series = master_df.loc[name]
+    qty = series['serving_qty']
+    grams = series['grams']
+    try:
+        serv_unit = ureg(series['serving_unit'])
+    except (AttributeError, UndefinedUnitError):
+        return None
+    if not qty or not grams or np.isnan(qty) or np.isnan(grams):
+        return None
+    return grams * ureg.gram / (qty * serv_unit)
+
+def _bridge(values, target, density):
+    """
+    Converts an array quantity to the target units through
+    the density, going from mass or to mass.
+
+    Raises
+    ------
+    DimensionalityError
+        When the units can't be bridged.
+    """
+    try:
+        return (values * density).to(target)
+    except DimensionalityError:
+        return (values / density).to(target)
+
+def _to_target(amount, target, density_fn):
+    """
+    Converts one amount to the target units, only looking up
+    the density when the dimensions differ.
+
+    Raises
+    ------
+    DimensionalityError
+        When the units can't be bridged.
+    """
+    try:
+        return amount.to(target)
+    except DimensionalityError:
+        density = density_fn()
+        if density is None:
+            raise
+    return _bridge(amount, target, density)
+
+def normalize_group(foods, ureg, density=None):
+    """
+    Sums every contribution of one food into the units of
+    the first contribution.
+
+    Parameters
+    ----------
+    foods : list
+        Food items that share a name.
+    ureg : UnitRegistry
+        The shared unit registry.
+    density : pint.Quantity or callable, optional, default=None
+        Grams per unit, or a function returning it that is
+        only called when units of different dimensions meet.
+
+    Returns
+    -------
+    Food, list
+        The combined food and the units that couldn't be
+        converted.
+    """
+    first = foods[0]
+    target = first.amount.units
+    by_unit = {}
+    days = set()
+    for food in foods:
+        #Leftovers of already combined foods are tried again too.
+        for amount in [food.amount, *food.leftovers]:
+            by_unit.setdefault(amount.units, []).append(amount.magnitude)
+        days |= food.days
+    total = 0.0
+    leftovers = []
+    for units, magnitudes in by_unit.items():
+        values = ureg.Quantity(np.asarray(magnitudes, dtype=float), units)
+        try:
+            total += values.to(target).magnitude.sum()
+            continue
+        except DimensionalityError:
+            pass
+        if callable(density):
+            density = density()
+        if density is not None:
+            try:
+                total += _bridge(values, target, density).magnitude.sum()
+                continue
+            except DimensionalityError:
+                pass
+        leftovers.append(ureg.Quantity(values.magnitude.sum(), units))
+    amount = ureg.Quantity(float(total), target)
+    combined = type(first)(first.name, amount, first.rec_unit, first.food_type)
+    combined.days = days
+    combined.leftovers = leftovers
+    return combined, [str(left.units) for left in leftovers]
+
+def normalize_foods(contributions, master_df, ureg, cur_logger):
+    """
+    Combines the contributions for every food, reporting
+    amounts that couldn't be converted once per food.
+
+    Parameters
+    ----------
+    contributions : dict
+        Lists of Food items by name.
+    master_df : pd.DataFrame
+        Master food list used for densities.
+    ureg : UnitRegistry
+        The shared unit registry.
+    cur_logger : logging.Logger
+        Logger to report unconvertible amounts to.
+
+    Returns
+    -------
+    dict
+        One Food by name.
+    """
+    all_food = {}
+    for name, foods in contributions.items():
+        density = partial(get_density, master_df, name, ureg)
+        food, bad_units = normalize_group(foods, ureg, density)
+        if bad_units:
+            msg = f'Unable to convert {", ".join(bad_units)} to {food.amount.units} for {name}'
+            cur_logger.warning(msg)
+            METRICS.conversion_failures.inc()
+        all_food[name] = food
+    return all_food
+
+def merge_on_hand(first, second):
+    """
+    Combines two on hand dictionaries, summing amounts for
+    the same name when their units are compatible.
+
+    Parameters
+    ----------
+    first : dict
+        Quantities by lowercase name.
+    second : dict
+        Quantities by lowercase name, wins when the units
+        of a shared name can't be added.
+
+    Returns
+    -------
+    dict
+    """
+    merged = dict(first)
+    for name, amount in second.items():
+        if name in merged:
+            try:
+                amount = amount + merged[name]
+            except DimensionalityError:
+                pass
+        merged[name] = amount
+    return merged
+
+def subtract_on_hand(all_food, ignored, on_hand, master_df, ureg, cur_logger):
+    """
+    Removes amounts already on hand from the combined foods.
+    Foods that are fully covered move to ignored, the rest
+    keep only the remaining amount.
+
+    Parameters
+    ----------
+    all_food : dict
+        Combined Food items by name, updated in place.
+    ignored : dict
+        Ignored Food items by name, updated in place.
+    on_hand : dict
+        Quantities by lowercase food name.
+    master_df : pd.DataFrame
+        Master food list used for densities.
+    ureg : UnitRegistry
+        The shared unit registry.
+    cur_logger : logging.Logger
+        Logger to report unconvertible amounts to.
+    """
+    if not on_hand:
+        return
+    for name in list(all_food):
+        have = on_hand.get(name.lower())
+        if have is None:
+            continue
+        food = all_food[name]
+        target = food.amount.units
+        try:
+            have = _to_target(have, target, partial(get_density, master_df, name, ureg))
+        except DimensionalityError:
+            msg = f'Unable to subtract {have} from {food.amount:.2f} of {name}'
+            cur_logger.warning(msg)
+            METRICS.conversion_failures.inc()
+            continue
+        if have >= food.amount:
+            ignored[name] = all_food.pop(name)
+            continue
+        food.amount = food.amount - have
+        if name in ignored:
+            ignored[name].amount += have
+        else:
+            used = copy.copy(food)
+            used.amount = have
+            ignored[name] = used
@@ -0,0 +1,203 @@
+"""
+Rolls up the nutrients of the planned foods per day and per
+plan sheet while the plan tabs are aggregated, so the report
+never walks the plans a second time.
+"""
+import numpy as np
+import pandas as pd
+from pint import DimensionalityError, UndefinedUnitError
+
+import shopping_list
+
+def ingredient_servings(food, series, ureg):
+    """
+    Servings of a Master food in an ingredient amount.
+
+    Parameters
+    ----------
+    food : Food
+        The ingredient.
+    series : pd.Series
+        Typed Master row of the ingredient.
+    ureg : UnitRegistry
+        The shared unit registry.
+
+    Returns
+    -------
+    float or None
+        None when the amount can't be converted.
+    """
+    try:
+        serving = series['serving_qty'] * ureg(series['serving_unit'])
+        servings = float((food.amount / serving).to('dimensionless').magnitude)
+    except (AttributeError, UndefinedUnitError, DimensionalityError):
+        servings = np.nan
+    if not np.isfinite(servings):
+        #Amounts by weight are converted through the serving grams.
+        try:
+            servings = float(food.amount.to('gram').magnitude / series['grams'])
+        except DimensionalityError:
+            return None
+    return servings if np.isfinite(servings) else None
+
+class NutritionRollup():
+    """
+    Nutrient totals by plan sheet and day. Per serving
+    nutrients are taken from the master list once as a matrix
+    and each tab adds its servings with one matrix product.
+
+    Parameters
+    ----------
+    master_df : pd.DataFrame
+        Master food list indexed by name.
+    nutrients : list
+        Columns of master_df with nutrients per serving.
+    recipes : dict, optional, default=None
+        Recipes by name, those not in Master are expanded
+        through their ingredients once up front.
+    ureg : UnitRegistry, optional, default=None
+        The shared unit registry, needed with recipes.
+    """
+
+    def __init__(self, master_df, nutrients, recipes=None, ureg=None):
+        self.nutrients = [nutrient for nutrient in nutrients if nutrient in master_df.columns]
+        master_df = master_df[~master_df.index.duplicated()]
+        per_serving = np.nan_to_num(
+            master_df[self.nutrients].to_numpy(dtype=float)).reshape(len(master_df), -1)
+        names = list(master_df.index)
+        rows = {name:row for row, name in enumerate(names)}
+        recipe_rows = []
+        #Recipes with ingredients that couldn't be counted.
+        self.partial = set()
+        for name, recipe in (recipes or {}).items():
+            if name in rows or not self.nutrients:
+                continue
+            per_recipe = np.zeros(len(self.nutrients))
+            for ing in recipe.ingredients:
+                servings = None
+                if ing.name in rows:
+                    servings = ingredient_servings(ing, master_df.loc[ing.name], ureg)
+                if servings is None:
+                    self.partial.add(name)
+                    continue
+                per_recipe += servings * per_serving[rows[ing.name]]
+            names.append(name)
+            recipe_rows.append(per_recipe * recipe.rec_per_serv)
+        if recipe_rows:
+            per_serving = np.vstack([per_serving, recipe_rows])
+        self._index = pd.Index(names)
+        self._per_serving = per_serving
+        self.totals = {}
+        self.unmatched = set()
+
+    @classmethod
+    def from_config(cls, master_df, recipes=None, ureg=None):
+        """
+        Builds a rollup of the configured nutrient columns.
+
+        Parameters
+        ----------
+        master_df : pd.DataFrame
+            Master food list indexed by name.
+        recipes : dict, optional, default=None
+            Recipes by name to expand through ingredients.
+        ureg : UnitRegistry, optional, default=None
+            The shared unit registry, needed with recipes.
+
+        Returns
+        -------
+        NutritionRollup
+        """
+        return cls(master_df, list(shopping_list.get_value('nutrient_columns')), recipes, ureg)
+
+    def __bool__(self):
+        return bool(self.nutrients)
+
+    def add_tab(self, sheet_name, day, names, servings):
+        """
+        Adds the nutrients of one tab's kept rows.
+
+        Parameters
+        ----------
+        sheet_name : str
+            Plan sheet of the tab.
+        day : datetime
+            Day of the tab.
+        names : array_like
+            Names of the chosen items.
+        servings : array_like
+            Servings of each chosen item.
+        """
+        rows = self._index.get_indexer(names)
+        found = rows >= 0
+        if not found.all():
+            self.unmatched.update(np.asarray(names)[~found])
+        servings = np.asarray(servings, dtype=float)[found]
+        total = servings @ self._per_serving[rows[found]]
+        key = (sheet_name, day)
+        if key in self.totals:
+            self.totals[key] = self.totals[key] + total
+        else:
+            self.totals[key] = total
+
+    def by_day(self):
+        """
+        Totals of every sheet summed per day.
+
+        Returns
+        -------
+        dict
+            Nutrient arrays by day in date order.
+        """
+        days = {}
+        for (_, day), total in sorted(self.totals.items(), key=lambda pair: pair[0][1]):
+            days[day] = days.get(day, 0) + total
+        return days
+
+    def format(self, total):
+        """
+        Formats one row of totals.
+
+        Returns
+        -------
+        str
+            Like 'Calories 2100, Protein 95'.
+        """
+        return ', '.join(
+            f'{nutrient} {value:.0f}' for nutrient, value in zip(self.nutrients, total))
+
+    def report(self):
+        """
+        Lines of the per day report, each day's sheets are
+        listed under it when more than one sheet has that day.
+
+        Returns
+        -------
+        list
+        """
+        lines = ['Nutrition by Day']
+        sheets = {}
+        for (sheet_name, day), total in self.totals.items():
+            sheets.setdefault(day, []).append((sheet_name, total))
+        for day, total in self.by_day().items():
+            lines.append(f"{day.strftime('%a %m/%d')} - {self.format(total)}")
+            if len(sheets[day]) > 1:
+                for sheet_name, sheet_total in sorted(sheets[day], key=lambda pair: pair[0]):
+                    lines.append(f'  {sheet_name} - {self.format(sheet_total)}')
+        if self.unmatched:
+            lines.append(f"Not in master list: {', '.join(sorted(self.unmatched))}")
+        if self.partial:
+            lines.append(f"Recipes missing ingredients: {', '.join(sorted(self.partial))}")
+        return lines
+
+    def save(self, output_file):
+        """
+        Writes the report to a text file.
+
+        Parameters
+        ----------
+        output_file : Path
+            Path of the text file.
+        """
+        with open(output_file, 'w', encoding='utf-8') as n_file:
+            n_file.write('\n'.join(self.report()) + '\n')
@@ -0,0 +1,134 @@
+"""
+Rounds the combined amount of a food up to the whole
+packages it is sold in, like 15.5 ounce cans of beans.
+Sizes come from a local YAML file and are converted to base
+units once when the catalog loads.
+"""
+from collections import namedtuple
+import logging
+
+import numpy as np
+from pint import DimensionalityError, UndefinedUnitError
+import yaml
+
+from shopping_list import PACKAGES_PATH
+from shopping_list.normalize import get_density
+
+#size is the magnitude in base units, density is in base units or None.
+PackageSize = namedtuple('PackageSize', 'size units label density')
+
+class PackageTable():
+    """
+    Package sizes by food name.
+
+    Parameters
+    ----------
+    sizes : dict
+        Dicts with 'size', like '15.5 ounce', and an optional
+        'unit' label, like 'can', by food name.
+    master_df : pd.DataFrame
+        Master food list used for densities.
+    ureg : UnitRegistry
+        The shared unit registry.
+    """
+
+    def __init__(self, sizes, master_df, ureg):
+        logger = logging.getLogger(__name__)
+        self._packages = {}
+        for name, entry in (sizes or {}).items():
+            try:
+                size = ureg(str(entry['size'])).to_base_units()
+            except (KeyError, TypeError, AttributeError, UndefinedUnitError):
+                msg = f'Invalid package size for {name} {entry}'
+                logger.warning(msg)
+                continue
+            density = get_density(master_df, name, ureg)
+            if density is not None:
+                density = density.to_base_units()
+            self._packages[name] = PackageSize(
+                float(size.magnitude), size.units, entry.get('unit', 'package'), density)
+
+    @classmethod
+    def load(cls, master_df, ureg, path=PACKAGES_PATH):
+        """
+        Reads the package sizes file, a missing file gives an
+        empty table.
+
+        Parameters
+        ----------
+        master_df : pd.DataFrame
+            Master food list used for densities.
+        ureg : UnitRegistry
+            The shared unit registry.
+        path : Path, optional, default=PACKAGES_PATH
+            YAML file of sizes by food name.
+
+        Returns
+        -------
+        PackageTable
+        """
+        sizes = {}
+        if path.exists():
+            with open(path, 'rb') as p_file:
+                sizes = yaml.load(p_file, yaml.Loader)
+        return cls(sizes, master_df, ureg)
+
+    def __contains__(self, name):
+        return name in self._packages
+
+    def __len__(self):
+        return len(self._packages)
+
+    def _base_amount(self, amount, package):
+        """Amount in the package's base units, bridging through the density."""
+        amount = amount.to_base_units()
+        if amount.units == package.units:
+            return amount.magnitude
+        if package.density is None:
+            return None
+        for bridged in (amount * package.density, amount / package.density):
+            bridged = bridged.to_base_units()
+            if bridged.units == package.units:
+                return bridged.magnitude
+        return None
+
+    def round_up(self, foods, tolerance=0.02):
+        """
+        Sets the whole packages to buy on every food with a
+        known package size.
+
+        Parameters
+        ----------
+        foods : iterable
+            Food items, their packages attribute is set.
+        tolerance : float, optional, default=0.02
+            Packages over a whole number that still round down.
+
+        Returns
+        -------
+        int
+            Number of foods given packages.
+        """
+        logger = logging.getLogger(__name__)
+        rounded = []
+        amounts = []
+        sizes = []
+        for food in foods:
+            package = self._packages.get(food.name)
+            if package is None:
+                continue
+            try:
+                amount = self._base_amount(food.amount, package)
+            except DimensionalityError:
+                amount = None
+            if amount is None:
+                msg = f'Unable to fit {food.amount.units} of {food.name} into packages'
+                logger.warning(msg)
+                continue
+            rounded.append((food, package.label))
+            amounts.append(amount)
+            sizes.append(package.size)
+        counts = np.maximum(np.ceil(np.array(amounts) / np.array(sizes) - tolerance), 1)
+        for (food, label), count in zip(rounded, counts):
+            food.packages = (int(count), label)
+        return len(rounded)
@@ -0,0 +1,124 @@
+"""
+Pantry inventory of amounts already on hand, kept in a
+small SQLite database in the user's home directory.
+"""
+import contextlib
+import sqlite3
+import time
+
+from shopping_list import PANTRY_PATH
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pantry (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    qty REAL NOT NULL,
+    unit TEXT NOT NULL,
+    updated REAL NOT NULL
+)
+"""
+
+class Pantry():
+    """
+    Stores quantities with units by case-insensitive name.
+    Every change is its own transaction so edits from the
+    dynamic sheet never rewrite the config file.
+
+    Parameters
+    ----------
+    path : Path, optional, default=PANTRY_PATH
+        Location of the database.
+    """
+
+    def __init__(self, path=PANTRY_PATH):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(_SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Opens a connection and commits or rolls back on exit."""
+        conn = sqlite3.connect(self.path)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def set_amount(self, name, qty, unit):
+        """
+        Sets the amount on hand of an item.
+
+        Parameters
+        ----------
+        name : str
+            Name of the food or recipe.
+        qty : float
+            Amount on hand, zero or less removes the item.
+        unit : str
+            Units of the amount.
+        """
+        with self._connect() as conn:
+            if qty <= 0:
+                conn.execute('DELETE FROM pantry WHERE key = ?', (name.lower(),))
+                return
+            conn.execute(
+                'INSERT INTO pantry (key, name, qty, unit, updated) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT(key) DO UPDATE SET '
+                'name=excluded.name, qty=excluded.qty, unit=excluded.unit, updated=excluded.updated',
+                (name.lower(), name, float(qty), unit, time.time()))
+
+    def set_quantity(self, name, amount):
+        """
+        Sets the amount on hand from a pint quantity.
+
+        Parameters
+        ----------
+        name : str
+            Name of the food or recipe.
+        amount : pint.Quantity
+            Amount on hand.
+        """
+        self.set_amount(name, float(amount.magnitude), str(amount.units))
+
+    def remove(self, name):
+        """
+        Removes an item from the pantry.
+
+        Parameters
+        ----------
+        name : str
+            Name of the food or recipe.
+        """
+        with self._connect() as conn:
+            conn.execute('DELETE FROM pantry WHERE key = ?', (name.lower(),))
+
+    def items(self):
+        """
+        Lists everything in the pantry.
+
+        Returns
+        -------
+        list
+            (name, qty, unit) tuples sorted by name.
+        """
+        with self._connect() as conn:
+            return conn.execute('SELECT name, qty, unit FROM pantry ORDER BY key').fetchall()
+
+    def on_hand(self, ureg):
+        """
+        Loads every amount on hand with one query.
+
+        Parameters
+        ----------
+        ureg : UnitRegistry
+            Registry to build the amounts with.
+
+        Returns
+        -------
+        dict
+            Quantities by lowercase name.
+        """
+        with self._connect() as conn:
+            rows = conn.execute('SELECT key, qty, unit FROM pantry').fetchall()
+        return {key:qty * ureg(unit) for key, qty, unit in rows if unit in ureg}
@@ -0,0 +1,214 @@
+"""
+Estimates what the shopping list costs at each store from a
+local price table. Prices are indexed once per food as
+arrays over the stores so a whole list is costed with a few
+array operations.
+"""
+import logging
+
+import numpy as np
+from pint import UndefinedUnitError
+import yaml
+
+from shopping_list import PRICES_PATH
+
+class CostEstimate():
+    """
+    Costs of a list at every store, NaN where a price is
+    unknown.
+
+    Parameters
+    ----------
+    stores : list
+        Store names in column order.
+    names : list
+        Food names in row order.
+    costs : np.ndarray
+        Cost of each food at each store.
+    """
+
+    def __init__(self, stores, names, costs):
+        self.stores = stores
+        self.costs = costs
+        self._rows = {name:row for row, name in enumerate(names)}
+
+    def __bool__(self):
+        return bool(self.stores) and bool(np.isfinite(self.costs).any())
+
+    def food(self, name):
+        """Costs of one food by store column."""
+        row = self._rows.get(name)
+        if row is None:
+            return np.full(len(self.stores), np.nan)
+        return self.costs[row]
+
+    def group(self, foods):
+        """
+        Sums the costs of some foods per store.
+
+        Parameters
+        ----------
+        foods : iterable
+            Food items of a group.
+
+        Returns
+        -------
+        np.ndarray
+        """
+        rows = [self._rows[food.name] for food in foods if food.name in self._rows]
+        return _nansum(self.costs[rows])
+
+    def total(self):
+        """Costs of the whole list per store."""
+        return _nansum(self.costs)
+
+    def format(self, costs):
+        """
+        Formats per store costs, skipping unknown stores.
+
+        Returns
+        -------
+        str
+            Like 'Aldi $4.20, Kroger $5.10'.
+        """
+        return ', '.join(
+            f'{store} ${cost:.2f}' for store, cost in zip(self.stores, costs)
+            if np.isfinite(cost)
+        )
+
+def _nansum(costs):
+    """Column sums that stay NaN when no row has a price."""
+    if not len(costs):
+        return np.full(costs.shape[1], np.nan)
+    known = np.isfinite(costs).any(axis=0)
+    return np.where(known, np.nansum(costs, axis=0), np.nan)
+
+class PriceTable():
+    """
+    Prices by food and store. Each price is either per amount,
+    like 'per: 2 pound', or per package label matching the
+    PackageTable, like 'per: can'.
+
+    Parameters
+    ----------
+    prices : dict
+        Dicts of {'price', 'per'} by store, by food name.
+    ureg : UnitRegistry
+        The shared unit registry.
+    """
+
+    def __init__(self, prices, ureg):
+        logger = logging.getLogger(__name__)
+        prices = prices or {}
+        self.stores = sorted({store for by_store in prices.values() for store in by_store})
+        columns = {store:col for col, store in enumerate(self.stores)}
+        #Per base unit prices by their units and per package prices by label.
+        self._unit_prices = {}
+        self._package_prices = {}
+        #What each store prices a food per, to explain unused prices.
+        self._pers = {}
+        self._warned = set()
+        for name, by_store in prices.items():
+            for store, entry in by_store.items():
+                try:
+                    price = float(entry['price'])
+                    per = str(entry.get('per', 'package'))
+                except (KeyError, TypeError, ValueError):
+                    msg = f'Invalid price for {name} at {store} {entry}'
+                    logger.warning(msg)
+                    continue
+                col = columns[store]
+                self._pers.setdefault(name, {})[col] = per
+                #Any per may name a package label, units are priced by amount too.
+                labels = self._package_prices.setdefault(name, {})
+                labels.setdefault(per, np.full(len(self.stores), np.nan))[col] = price
+                try:
+                    per_qty = ureg(per).to_base_units()
+                except (UndefinedUnitError, AttributeError):
+                    continue
+                if not per_qty.magnitude:
+                    msg = f'Price for {name} at {store} is per {per}, an empty amount'
+                    logger.warning(msg)
+                    continue
+                #Stores pricing by another dimension get their own row.
+                by_units = self._unit_prices.setdefault(name, {})
+                row = by_units.setdefault(per_qty.units, np.full(len(self.stores), np.nan))
+                row[col] = price / per_qty.magnitude
+
+    @classmethod
+    def load(cls, ureg, path=PRICES_PATH):
+        """
+        Reads the price file, a missing file gives an empty
+        table.
+
+        Parameters
+        ----------
+        ureg : UnitRegistry
+            The shared unit registry.
+        path : Path, optional, default=PRICES_PATH
+            YAML file of prices by food name and store.
+
+        Returns
+        -------
+        PriceTable
+        """
+        prices = {}
+        if path.exists():
+            with open(path, 'rb') as p_file:
+                prices = yaml.load(p_file, yaml.Loader)
+        return cls(prices, ureg)
+
+    def __bool__(self):
+        return bool(self.stores)
+
+    def estimate(self, foods):
+        """
+        Costs every food at every store. Whole packages are
+        priced by the package when the store sells by it,
+        otherwise by the amount.
+
+        Parameters
+        ----------
+        foods : iterable
+            Food items to cost.
+
+        Returns
+        -------
+        CostEstimate
+        """
+        foods = list(foods)
+        num_stores = len(self.stores)
+        amounts = np.full(len(foods), np.nan)
+        unit_prices = np.full((len(foods), num_stores), np.nan)
+        counts = np.full(len(foods), np.nan)
+        package_prices = np.full((len(foods), num_stores), np.nan)
+        for row, food in enumerate(foods):
+            by_units = self._unit_prices.get(food.name)
+            if by_units is not None:
+                amount = food.amount.to_base_units()
+                if amount.units in by_units:
+                    amounts[row] = amount.magnitude
+                    unit_prices[row] = by_units[amount.units]
+            if food.packages:
+                by_label = self._package_prices.get(food.name, {})
+                if food.packages[1] in by_label:
+                    counts[row] = food.packages[0]
+                    package_prices[row] = by_label[food.packages[1]]
+        by_package = counts[:, None] * package_prices
+        by_amount = amounts[:, None] * unit_prices
+        costs = np.where(np.isfinite(by_package), by_package, by_amount)
+        self._report_unused(foods, costs)
+        return CostEstimate(self.stores, [food.name for food in foods], costs)
+
+    def _report_unused(self, foods, costs):
+        """Warns once about each price that can't cost its food."""
+        logger = logging.getLogger(__name__)
+        for food, row in zip(foods, costs):
+            for col, per in self._pers.get(food.name, {}).items():
+                key = (food.name, col, str(food.amount.units))
+                if np.isfinite(row[col]) or key in self._warned:
+                    continue
+                self._warned.add(key)
+                msg = (f'{self.stores[col]} prices {food.name} per {per}, '
+                    f'which can\'t cost {food.amount.units}')
+                logger.warning(msg)
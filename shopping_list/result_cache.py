@@ -0,0 +1,105 @@
+"""
+Saves the results of the last build as compact JSON so
+they can be reopened after a restart without a rebuild.
+"""
+import datetime as dt
+import json
+import logging
+import os
+
+from shopping_list import CACHE_DIR
+from shopping_list.elements import Food, Recipe
+from shopping_list.results import ShoppingResults
+
+RESULT_PATH = CACHE_DIR / 'last_build.json'
+FORMAT_VERSION = 3
+
+def _days_to_list(days):
+    return sorted(day.isoformat() for day in days)
+
+def _days_from_list(days):
+    return {dt.date.fromisoformat(day) for day in days}
+
+def save_results(results, path=RESULT_PATH):
+    """
+    Writes the foods and recipes of a build.
+
+    Parameters
+    ----------
+    results : ShoppingResults
+        The results to save.
+    path : Path, optional, default=RESULT_PATH
+        Output file, replaced atomically.
+    """
+    foods = []
+    for food in results.foods.values():
+        foods.append([
+            food.name,
+            float(food.amount.magnitude),
+            str(food.amount.units),
+            food.rec_unit,
+            food.food_type,
+            _days_to_list(food.days),
+            [[float(left.magnitude), str(left.units)] for left in food.leftovers],
+            food.packages,
+        ])
+    recipes = [
+        [recipe.name, recipe.rec_per_serv, _days_to_list(recipe.days),
+            recipe.batches, recipe.leftover]
+        for recipe in results.recipes.values()
+    ]
+    data = {
+        'version':FORMAT_VERSION,
+        'created':results.created,
+        'foods':foods,
+        'recipes':recipes,
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as r_file:
+        json.dump(data, r_file, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+def load_results(ureg, path=RESULT_PATH):
+    """
+    Loads the results saved by save_results.
+
+    Parameters
+    ----------
+    ureg : UnitRegistry
+        Registry to rebuild the amounts with.
+    path : Path, optional, default=RESULT_PATH
+        File to read.
+
+    Returns
+    -------
+    ShoppingResults or None
+        None if there is no usable saved build.
+    """
+    logger = logging.getLogger(__name__)
+    if not path.exists():
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as r_file:
+            data = json.load(r_file)
+        if data.get('version') != FORMAT_VERSION:
+            return None
+        foods = {}
+        for name, qty, unit, rec_unit, food_type, days, leftovers, packages in data['foods']:
+            food = Food(name, qty * ureg(unit), rec_unit, food_type)
+            food.days = _days_from_list(days)
+            food.leftovers = [left_qty * ureg(left_unit) for left_qty, left_unit in leftovers]
+            food.packages = tuple(packages) if packages else None
+            foods[name] = food
+        recipes = {}
+        for name, rec_per_serv, days, batches, leftover in data['recipes']:
+            recipe = Recipe(name, rec_per_serv)
+            recipe.days = _days_from_list(days)
+            recipe.batches = batches
+            recipe.leftover = leftover
+            recipes[name] = recipe
+    except Exception: #pylint: disable=broad-except
+        msg = f'Unable to load saved results {path}'
+        logger.exception(msg)
+        return None
+    return ShoppingResults(foods, recipes, data['created'])
@@ -0,0 +1,175 @@
+"""
+Observable container for the foods and recipes of a
+finished build. Edits are published as small patches so
+views can update just the rows that changed.
+"""
+from collections import namedtuple
+import datetime as dt
+import time
+
+from shopping_list.groups import GroupIndex
+
+#op is 'add', 'remove' or 'change' and kind is 'food' or 'recipe'.
+Patch = namedtuple('Patch', 'op kind name item')
+
+class ShoppingResults():
+    """
+    Holds the shopping list, a sorted GroupIndex of the
+    foods and notifies subscribers of every change.
+
+    Parameters
+    ----------
+    foods : dict, optional, default=None
+        Food items by name.
+    recipes : dict, optional, default=None
+        Recipes by name.
+    created : float, optional, default=None
+        Timestamp of the build, defaults to now.
+    prices : PriceTable, optional, default=None
+        If provided, outputs include cost estimates.
+    """
+
+    def __init__(self, foods=None, recipes=None, created=None, prices=None):
+        self.created = created if created is not None else time.time()
+        self.prices = prices
+        self.foods = foods if foods is not None else {}
+        self.recipes = recipes if recipes is not None else {}
+        self.groups = GroupIndex(self.foods.values())
+        self._subscribers = []
+
+    def __bool__(self):
+        return bool(self.foods or self.recipes)
+
+    def created_str(self):
+        """
+        Formats when the results were built.
+
+        Returns
+        -------
+        str
+        """
+        return dt.datetime.fromtimestamp(self.created).strftime('%a %m/%d %H:%M')
+
+    def estimate(self):
+        """
+        Costs the current foods at every priced store.
+
+        Returns
+        -------
+        CostEstimate or None
+            None without a price table.
+        """
+        if not self.prices:
+            return None
+        return self.prices.estimate(self.foods.values())
+
+    def subscribe(self, callback):
+        """
+        Registers a callback called with every Patch.
+
+        Parameters
+        ----------
+        callback : func
+            Receives a Patch.
+        """
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """
+        Removes a callback from subscribe.
+
+        Parameters
+        ----------
+        callback : func
+            The registered callback.
+        """
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def _publish(self, patch):
+        for callback in list(self._subscribers):
+            callback(patch)
+        return patch
+
+    def add_food(self, food):
+        """
+        Adds a food or replaces the food with the same name.
+
+        Parameters
+        ----------
+        food : Food
+            The food to add.
+
+        Returns
+        -------
+        Patch
+        """
+        old_food = self.foods.get(food.name)
+        op = 'add'
+        if old_food is not None:
+            op = 'change'
+            self.groups.remove(old_food)
+        self.foods[food.name] = food
+        self.groups.add(food)
+        return self._publish(Patch(op, 'food', food.name, food))
+
+    def remove_food(self, name):
+        """
+        Removes a food by name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the food.
+
+        Returns
+        -------
+        Patch or None
+            None if the food wasn't in the list.
+        """
+        food = self.foods.pop(name, None)
+        if food is None:
+            return None
+        self.groups.remove(food)
+        return self._publish(Patch('remove', 'food', name, food))
+
+    def set_amount(self, name, amount):
+        """
+        Changes the amount of a food.
+
+        Parameters
+        ----------
+        name : str
+            Name of the food.
+        amount : pint.Quantity
+            The new amount.
+
+        Returns
+        -------
+        Patch or None
+            None if the food wasn't in the list.
+        """
+        food = self.foods.get(name)
+        if food is None:
+            return None
+        food.amount = amount
+        return self._publish(Patch('change', 'food', name, food))
+
+    def remove_recipe(self, name):
+        """
+        Removes a recipe by name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the recipe.
+
+        Returns
+        -------
+        Patch or None
+            None if the recipe wasn't in the list.
+        """
+        recipe = self.recipes.pop(name, None)
+        if recipe is None:
+            return None
+        return self._publish(Patch('remove', 'recipe', name, recipe))
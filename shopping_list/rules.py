@@ -0,0 +1,109 @@
+"""
+Skip rules for meals that don't need shopping, like eating
+out on Friday dinner. Rules come from the config and are
+compiled once per sheet and weekday into the meals to skip,
+which are applied to a whole tab as a row mask.
+"""
+import shopping_list
+
+#Matches every sheet, weekday or meal.
+ANY = '*'
+
+def _weekday(value):
+    """Normalizes a weekday name to its three letter form."""
+    value = str(value).strip().lower()
+    if value == ANY:
+        return ANY
+    return value[:3]
+
+class MealRules():
+    """
+    Compiled skip rules.
+
+    Parameters
+    ----------
+    rules : list
+        Dicts with optional 'sheet', 'day' and 'meal' keys,
+        a missing key matches everything so a rule without
+        a meal skips the whole day.
+    sections : list
+        Row names that start a meal section in the plans.
+    """
+
+    def __init__(self, rules, sections):
+        self.rules = [
+            (
+                str(rule.get('sheet', ANY)).strip().lower(),
+                _weekday(rule.get('day', ANY)),
+                str(rule.get('meal', ANY)).strip(),
+            )
+            for rule in rules
+        ]
+        self.sections = list(sections)
+        self._compiled = {}
+
+    @classmethod
+    def from_config(cls):
+        """
+        Builds the rules from the config.
+
+        Returns
+        -------
+        MealRules
+        """
+        return cls(shopping_list.get_value('skip_rules'), shopping_list.get_value('meal_sections'))
+
+    def skipped(self, sheet_name, day):
+        """
+        Meals skipped for a sheet on a day.
+
+        Parameters
+        ----------
+        sheet_name : str
+            Name of the plan sheet.
+        day : datetime.date
+            Day of the tab.
+
+        Returns
+        -------
+        frozenset
+            Skipped meal sections, ANY if the whole day is.
+        """
+        key = (sheet_name.lower(), day.strftime('%a').lower())
+        meals = self._compiled.get(key)
+        if meals is None:
+            meals = frozenset(
+                meal for sheet, weekday, meal in self.rules
+                if sheet in (ANY, key[0]) and weekday in (ANY, key[1])
+            )
+            if ANY in meals:
+                meals = frozenset([ANY])
+            self._compiled[key] = meals
+        return meals
+
+    def keep_mask(self, sheet_name, day, names):
+        """
+        Rows of a tab left after the skip rules.
+
+        Parameters
+        ----------
+        sheet_name : str
+            Name of the plan sheet.
+        day : datetime.date
+            Day of the tab.
+        names : pd.Series
+            First column of the tab.
+
+        Returns
+        -------
+        pd.Series
+            True for rows to keep.
+        """
+        meals = self.skipped(sheet_name, day)
+        if not meals:
+            return names == names
+        if ANY in meals:
+            return names != names
+        #Label each row with the section it is under.
+        sections = names.where(names.isin(self.sections)).astype(object).ffill()
+        return ~sections.isin(meals)
@@ -0,0 +1,194 @@
+"""
+Every call to google goes through one scheduler that keeps
+reads under the per minute quota, retries rate limit and
+server errors with backoff and lets catalog reads go ahead
+of plan tabs.
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from gspread.exceptions import APIError
+
+import shopping_list
+from shopping_list.metrics import METRICS
+
+#Lower runs first.
+PRIORITY_CATALOG = 0
+PRIORITY_PLAN = 1
+PRIORITY_PREFETCH = 2
+
+#Status codes worth retrying.
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+def _status(exc):
+    response = getattr(exc, 'response', None)
+    return getattr(response, 'status_code', None)
+
+class TokenBucket():
+    """
+    Token bucket refilled at a steady rate.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second.
+    capacity : int
+        Most tokens held, the size of a burst.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.stamp = time.monotonic()
+
+    def wait_time(self):
+        """
+        Takes a token if one is available.
+
+        Returns
+        -------
+        float
+            0 if a token was taken, otherwise the seconds
+            until the next one.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class RequestScheduler():
+    """
+    Runs google calls under a token bucket in priority order,
+    retrying 429 and 5xx responses with exponential backoff
+    and jitter.
+
+    Parameters
+    ----------
+    per_minute : int, optional, default=60
+        Requests allowed per minute.
+    burst : int, optional, default=10
+        Requests allowed back to back.
+    max_retries : int, optional, default=5
+        Retries before the error is raised.
+    base_delay : float, optional, default=1
+        First backoff in seconds, doubled every retry.
+    max_delay : float, optional, default=32
+        Longest backoff in seconds.
+    """
+
+    def __init__(self, per_minute=60, burst=10, max_retries=5, base_delay=1, max_delay=32):
+        self.bucket = TokenBucket(per_minute / 60, burst)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._waiting = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    @classmethod
+    def from_config(cls):
+        """
+        Builds the scheduler with the configured quota.
+
+        Returns
+        -------
+        RequestScheduler
+        """
+        return cls(per_minute=shopping_list.get_value('requests_per_minute'))
+
+    def _acquire(self, priority):
+        """Blocks until this caller is first in line and has a token."""
+        ticket = (priority, next(self._counter))
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                if self._waiting[0] == ticket:
+                    delay = self.bucket.wait_time()
+                    if not delay:
+                        heapq.heappop(self._waiting)
+                        self._cond.notify_all()
+                        return
+                else:
+                    delay = None
+                self._cond.wait(delay)
+
+    def backoff(self, attempt):
+        """
+        Seconds to wait before a retry, with full jitter.
+
+        Parameters
+        ----------
+        attempt : int
+            Number of the retry starting at 0.
+
+        Returns
+        -------
+        float
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, func, *args, priority=PRIORITY_PLAN, **kwargs):
+        """
+        Calls a gspread function once it's allowed.
+
+        Parameters
+        ----------
+        func : func
+            The gspread call.
+        args : tuple
+            Positional arguments for func.
+        priority : int, optional, default=PRIORITY_PLAN
+            Order among waiting calls, lower goes first.
+        kwargs : dict
+            Keyword arguments for func.
+
+        Returns
+        -------
+        object
+            The result of func.
+
+        Raises
+        ------
+        APIError
+            If the error isn't retryable or retries ran out.
+        """
+        logger = logging.getLogger(__name__)
+        for attempt in range(self.max_retries + 1):
+            self._acquire(priority)
+            try:
+                return func(*args, **kwargs)
+            except APIError as exc:
+                status = _status(exc)
+                if status not in RETRY_STATUS or attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+                msg = f'Google returned {status}, retrying in {delay:.1f}s'
+                logger.warning(msg)
+                METRICS.request_retries.inc(status=status)
+                time.sleep(delay)
+        return None
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+def get_scheduler():
+    """
+    The scheduler shared by every build in the process.
+
+    Returns
+    -------
+    RequestScheduler
+    """
+    global _SCHEDULER #pylint: disable=global-statement
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = RequestScheduler.from_config()
+    return _SCHEDULER
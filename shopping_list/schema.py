@@ -0,0 +1,275 @@
+"""
+Column layouts of the google sheets. Each tab's header is
+validated once, columns are found by header name (falling
+back to their usual letter) and converted to typed columns
+up front, conversion problems are reported per column.
+"""
+from collections import namedtuple
+import sys
+
+import numpy as np
+import pandas as pd
+
+import shopping_list
+from shopping_list import SHEET_COLS
+from shopping_list.metrics import METRICS
+
+#Rows searched from the top of a tab for the header.
+HEADER_SCAN = 5
+
+Column = namedtuple('Column', 'field headers letter dtype categories')
+Column.__new__.__defaults__ = ((),)
+
+#Rows read along with a projected read to locate the columns.
+HEADER_ROWS = f'1:{HEADER_SCAN}'
+
+def _letter(pos):
+    """Column letters of a zero based position, like 'AB'."""
+    letters = ''
+    pos += 1
+    while pos:
+        pos, rem = divmod(pos - 1, 26)
+        letters = chr(ord('A') + rem) + letters
+    return letters
+
+def _position(letters):
+    """Zero based position of column letters."""
+    pos = 0
+    for letter in letters:
+        pos = pos*26 + ord(letter) - ord('A') + 1
+    return pos - 1
+
+class TableSchema():
+    """
+    Describes the columns a parser needs from a tab.
+
+    Parameters
+    ----------
+    name : str
+        Name of the table for messages.
+    columns : list
+        Column tuples, headers are the accepted header names
+        and letter is used when the tab has no header. dtype
+        is 'str', 'intern' (categorical of interned strings),
+        'float' or 'category' (limited to categories).
+    """
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = columns
+        self._aliases = {
+            header.lower():col.field for col in columns for header in col.headers
+        }
+
+    def ranges(self, positions=None):
+        """
+        Open ended A1 ranges covering the schema's columns,
+        adjacent columns are merged. Google trims the trailing
+        empty rows so a read stops at the last used row.
+
+        Parameters
+        ----------
+        positions : dict, optional, default=None
+            Column position by field from find_header, the
+            usual letters by default.
+
+        Returns
+        -------
+        list
+            Ranges like ['A:C', 'N:N'].
+        """
+        if positions is None:
+            positions = {col.field:SHEET_COLS[col.letter] for col in self.columns}
+        spans = []
+        for pos in sorted(set(positions.values())):
+            if spans and spans[-1][1] == pos - 1:
+                spans[-1][1] = pos
+            else:
+                spans.append([pos, pos])
+        return [f'{_letter(first)}:{_letter(last)}' for first, last in spans]
+
+    def header_ranges(self, header_rows):
+        """
+        Ranges of the columns found in the top rows of a tab,
+        so columns that moved are still read.
+
+        Parameters
+        ----------
+        header_rows : list
+            The HEADER_ROWS of the tab.
+
+        Returns
+        -------
+        list
+            Ranges like ['A:C', 'N:N'].
+        """
+        return self.ranges(self.find_header(header_rows)[1])
+
+    def assemble(self, value_ranges, ranges=None):
+        """
+        Places the values read from ranges back at their
+        column positions so they parse like a full tab.
+
+        Parameters
+        ----------
+        value_ranges : list
+            Rows of each range in the order of ranges.
+        ranges : list, optional, default=None
+            The ranges read, the usual letters by default.
+
+        Returns
+        -------
+        list
+            List of lists as from get_all_values.
+        """
+        if ranges is None:
+            ranges = self.ranges()
+        spans = [[_position(letters) for letters in rng.split(':')] for rng in ranges]
+        num_rows = max((len(values) for values in value_ranges), default=0)
+        width = max((last for _, last in spans), default=-1) + 1
+        rows = [[''] * width for _ in range(num_rows)]
+        for (start, _), values in zip(spans, value_ranges):
+            for row, cells in zip(rows, values):
+                row[start:start + len(cells)] = cells
+        return rows
+
+    def find_header(self, rows):
+        """
+        Finds the header row and the position of each field.
+
+        Parameters
+        ----------
+        rows : list
+            List of lists from the tab.
+
+        Returns
+        -------
+        int or None, dict
+            Row of the header (None without one) and the
+            column position by field.
+        """
+        for row_num, row in enumerate(rows[:HEADER_SCAN]):
+            found = {}
+            for pos, value in enumerate(row):
+                field = self._aliases.get(str(value).strip().lower())
+                if field and field not in found:
+                    found[field] = pos
+            if len(found) >= min(2, len(self.columns)):
+                return row_num, found
+        return None, {col.field:SHEET_COLS[col.letter] for col in self.columns}
+
+    def load(self, data, cur_logger=None, label=''):
+        """
+        Converts a tab into a typed DataFrame with one column
+        per field, see load_columns.
+
+        Returns
+        -------
+        pd.DataFrame
+            Columns named by field, missing columns are empty.
+        """
+        return pd.DataFrame(self.load_columns(data, cur_logger, label))
+
+    def load_columns(self, data, cur_logger=None, label=''):
+        """
+        Converts a tab into typed columns without building a
+        frame of the whole tab.
+
+        Parameters
+        ----------
+        data : list or pd.DataFrame
+            Rows of the tab as strings.
+        cur_logger : logging.Logger, optional, default=None
+            Receives one warning per problem column.
+        label : str, optional, default=''
+            Prefix for messages, like the sheet and day.
+
+        Returns
+        -------
+        dict
+            Series by field, missing columns are empty.
+        """
+        if isinstance(data, pd.DataFrame):
+            rows = data.values.tolist()
+        else:
+            rows = data
+        header_row, positions = self.find_header(rows)
+        if header_row is not None:
+            rows = rows[header_row + 1:]
+        width = max((len(row) for row in rows), default=0)
+        typed = {}
+        for col in self.columns:
+            pos = positions.get(col.field)
+            if pos is None or pos >= width:
+                if rows:
+                    self._report(cur_logger, label, col, 'missing from the tab')
+                raw = pd.Series([''] * len(rows), dtype=object)
+            else:
+                raw = pd.Series([row[pos] if pos < len(row) else '' for row in rows], dtype=object)
+            typed[col.field] = self._convert(raw, col, cur_logger, label)
+        return typed
+
+    def _convert(self, raw, col, cur_logger, label):
+        """Converts one column, reporting bad values once."""
+        raw = raw.fillna('').astype(str).str.strip()
+        if col.dtype == 'float':
+            values = pd.to_numeric(raw, errors='coerce').astype(float)
+            bad = values.isna() & (raw != '')
+        elif col.dtype == 'category':
+            known = raw.where(raw.isin(col.categories), np.nan)
+            values = pd.Series(pd.Categorical(known, categories=col.categories))
+            bad = values.isna() & (raw != '')
+        elif col.dtype == 'intern':
+            #Repeated names share one interned string and compare by code.
+            values = raw.astype('category')
+            return values.cat.rename_categories([sys.intern(cat) for cat in values.cat.categories])
+        else:
+            return raw
+        if bad.any():
+            METRICS.conversion_failures.inc(int(bad.sum()))
+            rows = list(bad[bad].index[:5])
+            sample = list(raw[bad].unique()[:3])
+            msg = f'{int(bad.sum())} values could not be converted {sample} (rows {rows})'
+            self._report(cur_logger, label, col, msg)
+        return values
+
+    def _report(self, cur_logger, label, col, problem):
+        if cur_logger is None:
+            return
+        msg = f'{label} {self.name} column {col.headers[0]} ({col.letter}) {problem}'
+        cur_logger.warning(msg.strip())
+
+PLAN_SCHEMA = TableSchema('plan', [
+    Column('name', ('Food', 'Name', 'Item'), 'A', 'intern'),
+    Column('qty', ('Qty', 'Quantity', 'Amount'), 'B', 'float'),
+    Column('unit_type', ('Unit Type', 'Unit', 'Units'), 'C', 'category', ('grams', 'servings')),
+    Column('serv_grams', ('Serv Weight (g)', 'Serving Weight (g)', 'Serv Weight'), 'N', 'float'),
+])
+
+_MASTER_COLUMNS = [
+    Column('name', ('Name', 'Food'), 'A', 'intern'),
+    Column('serving_qty', ('Serving Qty', 'Serving Quantity'), 'F', 'float'),
+    Column('serving_unit', ('Serving Unit', 'Unit'), 'G', 'intern'),
+    Column('grams', ('Grams', 'Serving Weight (g)', 'Serv Weight (g)'), 'H', 'float'),
+    Column('food_type', ('Food Type', 'Type', 'Category'), 'M', 'intern'),
+]
+
+def master_schema(nutrient_columns=None):
+    """
+    Master columns plus optional per serving nutrients.
+
+    Parameters
+    ----------
+    nutrient_columns : dict, optional, default=None
+        Column letter by nutrient header, like {'Calories':'I'}.
+
+    Returns
+    -------
+    TableSchema
+    """
+    columns = list(_MASTER_COLUMNS)
+    for nutrient, letter in (nutrient_columns or {}).items():
+        columns.append(Column(nutrient, (nutrient,), letter, 'float'))
+    return TableSchema('master', columns)
+
+MASTER_SCHEMA = master_schema(shopping_list.get_value('nutrient_columns'))
@@ -0,0 +1,362 @@
+"""
+Keeps a local copy of the values from each plan tab so
+unchanged days don't have to be downloaded every build.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import shopping_list
+from shopping_list import CACHE_DIR
+from shopping_list.scheduler import PRIORITY_PLAN, get_scheduler
+from shopping_list.schema import HEADER_ROWS
+
+def content_hash(values):
+    """
+    Hashes a list of rows into a stable key.
+
+    Parameters
+    ----------
+    values : list
+        List of lists from a worksheet.
+
+    Returns
+    -------
+    str
+        Hex digest of the values.
+    """
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha256(raw).hexdigest()
+
+def get_revision(spreadsheet, priority=PRIORITY_PLAN):
+    """
+    Retrieves the revision marker of a spreadsheet from
+    drive, one request covers every tab in it.
+
+    Parameters
+    ----------
+    spreadsheet : gspread.Spreadsheet
+        The spreadsheet to check.
+    priority : int, optional, default=PRIORITY_PLAN
+        Scheduler priority of the request.
+
+    Returns
+    -------
+    str or None
+        The last modified time or None if it's unavailable.
+    """
+    try:
+        return get_scheduler().call(spreadsheet.get_lastUpdateTime, priority=priority)
+    except Exception: #pylint: disable=broad-except
+        return None
+
+#Ranges last found from each tab's header, by spreadsheet, tab and schema.
+_HEADER_RANGES = {}
+
+def read_values(sheet, schema=None, priority=PRIORITY_PLAN):
+    """
+    Downloads a tab, only the schema's columns if one is
+    given. The header rows are read in the same request as
+    the columns last found for the tab (the usual letters at
+    first), the columns are read again only if they moved.
+
+    Parameters
+    ----------
+    sheet : gspread.Worksheet
+        The tab to read.
+    schema : TableSchema, optional, default=None
+        Limits the read to the columns the parser uses.
+    priority : int, optional, default=PRIORITY_PLAN
+        Scheduler priority of the request.
+
+    Returns
+    -------
+    list
+        List of lists of the tab values.
+    """
+    scheduler = get_scheduler()
+    if schema is None:
+        return scheduler.call(sheet.get_all_values, priority=priority)
+    key = (sheet.spreadsheet_id, sheet.id, schema.name)
+    ranges = _HEADER_RANGES.get(key) or schema.ranges()
+    header_rows, *value_ranges = scheduler.call(
+        sheet.batch_get, [HEADER_ROWS, *ranges], priority=priority)
+    found = schema.header_ranges(header_rows)
+    _HEADER_RANGES[key] = found
+    if found != ranges:
+        msg = f'{sheet.title} columns moved, reading {", ".join(found)}'
+        logging.getLogger(__name__).debug(msg)
+        ranges = found
+        value_ranges = scheduler.call(sheet.batch_get, ranges, priority=priority)
+    return schema.assemble(value_ranges, ranges)
+
+#Locks by index path, caches over the same directory share one.
+_INDEX_LOCKS = {}
+_INDEX_LOCKS_LOCK = threading.Lock()
+
+def _index_lock(index_path):
+    """Lock guarding one index file within the process."""
+    with _INDEX_LOCKS_LOCK:
+        return _INDEX_LOCKS.setdefault(str(index_path.resolve()), threading.Lock())
+
+class TabCache():
+    """
+    Content addressed cache of worksheet values keyed by
+    spreadsheet id and tab id. Values are stored once per
+    unique content and evicted least recently used first
+    when the cache grows past max_bytes.
+
+    Parameters
+    ----------
+    cache_dir : Path, optional, default=CACHE_DIR
+        Directory to hold the index and values.
+    max_bytes : int, optional, default=50MB
+        Size limit of all stored values.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_bytes=50*1024*1024):
+        self.cache_dir = cache_dir
+        self.tab_dir = cache_dir / 'tabs'
+        self.index_path = self.tab_dir / 'index.json'
+        self.max_bytes = max_bytes
+        self.tab_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = _index_lock(self.index_path)
+        self._index = self._load_index()
+        #Keys dropped since the last save so merging doesn't restore them.
+        self._removed = set()
+        #Hits only touch the index in memory until flush.
+        self._dirty = False
+
+    @classmethod
+    def from_config(cls):
+        """
+        Creates the cache using the size in the config.
+
+        Returns
+        -------
+        TabCache
+        """
+        size_mb = shopping_list.get_value('cache_size_mb')
+        return cls(max_bytes=int(size_mb*1024*1024))
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            return {}
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as i_file:
+                return json.load(i_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        """
+        Merges the index on disk, which another cache may have
+        written, evicts and replaces it through a unique temp
+        file. Called with the lock held.
+        """
+        for key, entry in self._load_index().items():
+            if key in self._removed:
+                continue
+            current = self._index.get(key)
+            if current is None or entry['used'] > current['used']:
+                self._index[key] = entry
+        self._evict()
+        self._dirty = False
+        with tempfile.NamedTemporaryFile(
+                'w', encoding='utf-8', dir=self.tab_dir, suffix='.tmp', delete=False) as i_file:
+            json.dump(self._index, i_file)
+        os.replace(i_file.name, self.index_path)
+        self._removed.clear()
+
+    def _blob_path(self, digest):
+        return self.tab_dir / f'{digest}.json'
+
+    @staticmethod
+    def key(spreadsheet_id, tab_id):
+        """
+        Builds the index key for a tab.
+
+        Returns
+        -------
+        str
+        """
+        return f'{spreadsheet_id}/{tab_id}'
+
+    def validator(self, revision=None):
+        """
+        Determines the validator for a tab from the revision
+        of its spreadsheet.
+
+        Parameters
+        ----------
+        revision : str, optional, default=None
+            Revision of the parent spreadsheet.
+
+        Returns
+        -------
+        str or None
+            None if the revision is unknown, any part of the
+            tab may have changed so it can't be validated.
+        """
+        if revision:
+            return f'rev:{revision}'
+        return None
+
+    def lookup(self, key, validator):
+        """
+        Retrieves the cached values if the validator matches,
+        the hit is saved by the next flush or store.
+
+        Parameters
+        ----------
+        key : str
+            Key from TabCache.key.
+        validator : str
+            Validator from TabCache.validator.
+
+        Returns
+        -------
+        list or None
+            The cached rows or None on a miss.
+        """
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None or entry['validator'] != validator:
+                return None
+            blob_path = self._blob_path(entry['hash'])
+            try:
+                with open(blob_path, 'r', encoding='utf-8') as b_file:
+                    values = json.load(b_file)
+            except (OSError, ValueError):
+                self._index.pop(key)
+                self._removed.add(key)
+                self._dirty = True
+                return None
+            entry['used'] = time.time()
+            self._dirty = True
+            return values
+
+    def flush(self):
+        """
+        Saves the index if hits changed it since the last
+        save, called once per spreadsheet read.
+        """
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+
+    def store(self, key, validator, values):
+        """
+        Stores values for a tab and evicts old entries if
+        the cache is over its size.
+
+        Parameters
+        ----------
+        key : str
+            Key from TabCache.key.
+        validator : str
+            Validator from TabCache.validator.
+        values : list
+            Rows from the worksheet.
+        """
+        digest = content_hash(values)
+        blob_path = self._blob_path(digest)
+        with self._lock:
+            if not blob_path.exists():
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.tab_dir,
+                        suffix='.tmp', delete=False) as b_file:
+                    json.dump(values, b_file, separators=(',', ':'))
+                os.replace(b_file.name, blob_path)
+            self._index[key] = {
+                'hash':digest,
+                'validator':validator,
+                'size':blob_path.stat().st_size,
+                'used':time.time(),
+            }
+            self._removed.discard(key)
+            self._save_index()
+
+    def _evict(self):
+        """Removes least recently used entries until under max_bytes."""
+        sizes = {}
+        for entry in self._index.values():
+            sizes[entry['hash']] = entry['size']
+        total = sum(sizes.values())
+        by_age = sorted(self._index.items(), key=lambda item: item[1]['used'])
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            self._index.pop(key)
+            self._removed.add(key)
+            digest = entry['hash']
+            if any(other['hash'] == digest for other in self._index.values()):
+                continue
+            total -= sizes[digest]
+            try:
+                self._blob_path(digest).unlink()
+            except OSError:
+                pass
+
+    def get_values(self, spreadsheet, sheet, revision=None, priority=PRIORITY_PLAN, schema=None):
+        """
+        Returns the values of a tab, only downloading them when
+        the cached copy is stale or the revision is unknown.
+
+        Parameters
+        ----------
+        spreadsheet : gspread.Spreadsheet
+            Parent of the tab.
+        sheet : gspread.Worksheet
+            The tab to read.
+        revision : str, optional, default=None
+            Revision of the spreadsheet from get_revision.
+        priority : int, optional, default=PRIORITY_PLAN
+            Scheduler priority of the requests.
+        schema : TableSchema, optional, default=None
+            Limits the read to the columns the parser uses.
+
+        Returns
+        -------
+        list
+            List of lists of the tab values.
+        """
+        logger = logging.getLogger(__name__)
+        key = self.key(spreadsheet.id, sheet.id)
+        if schema is not None:
+            #Projected reads are stored apart from full tabs.
+            key = f"{key}/{schema.name}/{','.join(schema.ranges())}"
+        validator = self.validator(revision)
+        if validator is None:
+            msg = f'No revision for {spreadsheet.title}, reading {sheet.title} uncached'
+            logger.debug(msg)
+            return read_values(sheet, schema, priority)
+        values = self.lookup(key, validator)
+        if values is not None:
+            msg = f'Using cached {spreadsheet.title} - {sheet.title}'
+            logger.debug(msg)
+            return values
+        values = read_values(sheet, schema, priority)
+        self.store(key, validator, values)
+        return values
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache():
+    """
+    The tab cache shared by prefetching and every build in
+    the process, so they share one index and lock.
+
+    Returns
+    -------
+    TabCache
+    """
+    global _CACHE #pylint: disable=global-statement
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = TabCache.from_config()
+    return _CACHE
@@ -0,0 +1,252 @@
+"""
+Splits a shopping list into several trips. Each day a food
+is needed is assigned to the earliest trip it keeps from,
+given the shelf life of its food type, and every food's
+amount is shared out by the days of each trip. Days are
+held as bitmasks over the planned days so each food is
+split with a few integer operations.
+"""
+import copy
+import datetime as dt
+import logging
+from pathlib import Path
+
+import shopping_list
+from shopping_list.results import ShoppingResults
+
+def trip_dates(days, trips):
+    """
+    Shopping dates for the planned days.
+
+    Parameters
+    ----------
+    days : iterable
+        Days the plans cover.
+    trips : list
+        Dates or weekday names, like 'Sunday', a name is a
+        trip on every planned day with that weekday.
+
+    Returns
+    -------
+    list
+        Sorted trip dates, the first planned day is always
+        a trip so nothing is left unbought.
+    """
+    days = sorted(days)
+    if not days:
+        return []
+    weekdays = set()
+    dates = set()
+    for trip in trips:
+        if isinstance(trip, dt.date):
+            dates.add(trip.date() if isinstance(trip, dt.datetime) else trip)
+        else:
+            weekdays.add(str(trip).strip().lower()[:3])
+    dates.update(day for day in days if day.strftime('%a').lower() in weekdays)
+    dates = sorted(date for date in dates if date <= days[-1])
+    if not dates or dates[0] > days[0]:
+        dates.insert(0, days[0])
+    return dates
+
+def portion(food, days, share):
+    """
+    Copy of a food for some of its days with the amount and
+    leftovers scaled by share.
+
+    Parameters
+    ----------
+    food : Food
+        The whole food, it isn't changed.
+    days : iterable
+        Days of the portion.
+    share : float
+        Part of the food in the portion.
+
+    Returns
+    -------
+    Food
+    """
+    part = copy.copy(food)
+    part.days = set(days)
+    part.leftovers = [left * share for left in food.leftovers]
+    #Whole packages only stay valid for the whole food.
+    part.packages = food.packages if share == 1 else None
+    part *= share
+    return part
+
+class TripPlanner():
+    """
+    Trip assignment of the planned days per shelf life.
+
+    Parameters
+    ----------
+    days : iterable
+        Days the plans cover.
+    trips : list
+        Shopping dates or weekday names, see trip_dates.
+    shelf_life : dict
+        Days a food keeps by lower case food type, types not
+        listed keep for the whole plan.
+    """
+
+    def __init__(self, days, trips, shelf_life):
+        self.days = sorted(days)
+        self.trips = trip_dates(self.days, trips)
+        self.shelf_life = {f_type.lower():int(life) for f_type, life in shelf_life.items()}
+        self._bits = {day:1 << pos for pos, day in enumerate(self.days)}
+        #Day masks of every trip by shelf life, filled as lives are seen.
+        self._masks = {}
+
+    @classmethod
+    def from_config(cls, days):
+        """
+        Builds a planner from the configured trips.
+
+        Parameters
+        ----------
+        days : iterable
+            Days the plans cover.
+
+        Returns
+        -------
+        TripPlanner
+        """
+        return cls(days, shopping_list.get_value('shopping_trips'),
+            shopping_list.get_value('shelf_life'))
+
+    def __bool__(self):
+        return len(self.trips) > 1
+
+    def mask(self, days):
+        """Bitmask of some planned days."""
+        mask = 0
+        for day in days:
+            mask |= self._bits.get(day, 0)
+        return mask
+
+    def trip_masks(self, life=None):
+        """
+        Days bought on each trip by a food that keeps for
+        life days, the earliest trip it keeps from or else
+        the latest trip before the day.
+
+        Parameters
+        ----------
+        life : int, optional, default=None
+            Shelf life in days, None keeps for the whole plan.
+
+        Returns
+        -------
+        list
+            Day bitmasks in trip order.
+        """
+        masks = self._masks.get(life)
+        if masks is not None:
+            return masks
+        masks = [0]*len(self.trips)
+        for day, bit in self._bits.items():
+            before = [pos for pos, trip in enumerate(self.trips) if trip <= day] or [0]
+            fresh = [
+                pos for pos in before
+                if life is None or (day - self.trips[pos]).days <= life
+            ]
+            masks[fresh[0] if fresh else before[-1]] |= bit
+        self._masks[life] = masks
+        return masks
+
+    def split(self, foods, cur_logger=None):
+        """
+        Shares every food out over the trips by the days it
+        is needed on each, every portion is a copy.
+
+        Parameters
+        ----------
+        foods : dict
+            Food items by name, they aren't changed.
+        cur_logger : logging.Logger, optional, default=None
+            Receives a warning for days a food won't keep to.
+
+        Returns
+        -------
+        list
+            Dicts of food portions by name, one per trip.
+        """
+        if cur_logger is None:
+            cur_logger = logging.getLogger(__name__)
+        portions = [{} for _ in self.trips]
+        for name, food in foods.items():
+            life = self.shelf_life.get((food.food_type or '').lower())
+            food_mask = self.mask(food.days)
+            needed = food_mask.bit_count()
+            if not needed:
+                portions[0][name] = portion(food, food.days, 1)
+                continue
+            for pos, trip_mask in enumerate(self.trip_masks(life)):
+                shared = food_mask & trip_mask
+                if not shared:
+                    continue
+                days = {day for day in food.days if self._bits.get(day, 0) & shared}
+                portions[pos][name] = portion(food, days, shared.bit_count() / needed)
+                if life is not None:
+                    late = max(days) - self.trips[pos]
+                    if late.days > life:
+                        msg = f'{name} for {max(days):%a %m/%d} is bought {late.days} days early'
+                        cur_logger.warning(msg)
+        return portions
+
+    def split_recipes(self, recipes):
+        """
+        Recipes with a day in each trip, by trip.
+
+        Returns
+        -------
+        list
+            Dicts of recipes by name, one per trip.
+        """
+        by_trip = [{} for _ in self.trips]
+        masks = self.trip_masks()
+        for name, recipe in recipes.items():
+            rec_mask = self.mask(recipe.days)
+            for pos, trip_mask in enumerate(masks):
+                if rec_mask & trip_mask or (not rec_mask and pos == 0):
+                    by_trip[pos][name] = recipe
+        return by_trip
+
+    def trip_results(self, results, packages=None, cur_logger=None):
+        """
+        Splits finished results into the results of each trip.
+
+        Parameters
+        ----------
+        results : ShoppingResults
+            The whole shopping list.
+        packages : PackageTable, optional, default=None
+            If provided, each trip is rounded to whole packages.
+        cur_logger : logging.Logger, optional, default=None
+            Receives a warning for days a food won't keep to.
+
+        Returns
+        -------
+        list
+            Tuples of trip date and ShoppingResults.
+        """
+        by_trip = []
+        recipes = self.split_recipes(results.recipes)
+        for trip, foods, trip_recipes in zip(
+                self.trips, self.split(results.foods, cur_logger), recipes):
+            if packages is not None:
+                packages.round_up(foods.values())
+            by_trip.append((trip, ShoppingResults(
+                foods, trip_recipes, results.created, results.prices)))
+        return by_trip
+
+def trip_file(output_file, trip):
+    """
+    Path of one trip's list next to the whole list.
+
+    Returns
+    -------
+    Path
+    """
+    output_file = Path(output_file)
+    return output_file.with_name(f'{output_file.stem}_{trip:%m-%d}{output_file.suffix}')
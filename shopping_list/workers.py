@@ -54,13 +54,14 @@ class ShoppingWorker(QObject):
         The path to the output file.
     string_io : io.StringIO
         String to monitor for changes.
-    ignored : set
-        A set of names that should be ignored.
+    ignored : AlreadyHaveMatcher
+        Matches the names that should be ignored.
     fn_callback : func, optional, default=None
         If provided will be passed through the finished signal.
     """
 
-    finished = pyqtSignal(dict, dict, 'PyQt_PyObject')
+    #Foods and recipes are None when the build failed.
+    finished = pyqtSignal('PyQt_PyObject', 'PyQt_PyObject', 'PyQt_PyObject')
 
     def __init__(self, sheet_names, out_file, ignored, fn_callback=None):
         super().__init__()
@@ -71,8 +72,43 @@ class ShoppingWorker(QObject):
 
     def run(self):
         """
-        Builds the shopping list on a thread.
+        Builds the shopping list on a thread, finished is
+        always emitted so the gui is re-enabled.
         """
-        food_items, recipes = builder.build(
-            self.sheet_names, self.out_file, self.ignored)
+        food_items, recipes = None, None
+        try:
+            food_items, recipes = builder.build(
+                self.sheet_names, self.out_file, self.ignored)
+        except Exception: #pylint: disable=broad-except
+            builder.get_logger().exception('Building the shopping list failed')
         self.finished.emit(food_items, recipes, self.fn_callback)
+
+class PrefetchWorker(QObject):
+    """
+    Warms the tab cache in the background.
+
+    Parameters
+    ----------
+    sheet_names : list
+        Plan sheets to warm.
+    max_workers : int
+        Spreadsheets downloaded at the same time.
+    """
+
+    finished = pyqtSignal(int)
+
+    def __init__(self, sheet_names, max_workers):
+        super().__init__()
+        self.sheet_names = sheet_names
+        self.max_workers = max_workers
+
+    def run(self):
+        """
+        Prefetches the sheets on a thread.
+        """
+        warmed = 0
+        try:
+            warmed = builder.prefetch(self.sheet_names, self.max_workers)
+        except Exception: #pylint: disable=broad-except
+            builder.get_logger().exception('Prefetch failed')
+        self.finished.emit(warmed)
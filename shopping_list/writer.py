@@ -0,0 +1,224 @@
+"""
+Writes the shopping list text file and keeps it in sync
+with a ShoppingResults by patching only the lines that
+changed.
+"""
+import datetime as dt
+
+from shopping_list.elements import day_shortstr
+from shopping_list.groups import GroupIndex, arrange
+from shopping_list.normalize import normalize_foods
+
+REC_HEADER = 'Recipes Making this Week'
+COST_HEADER = 'Estimated Cost'
+
+def header_lines(today=None):
+    """
+    Builds the two line day and date header.
+
+    Parameters
+    ----------
+    today : datetime.date, optional, default=None
+        First day of the header, defaults to today.
+
+    Returns
+    -------
+    list
+        The header lines.
+    """
+    if today is None:
+        today = dt.date.today()
+    first_line = ''
+    second_line = ''
+    for day_num in range(7):
+        day = today + dt.timedelta(days=day_num)
+        end = ' '
+        if day_num == 6:
+            end = ''
+        day_block = f"{day.strftime('%A')}{end}"
+        first_line += day_block
+        date_block = day.strftime('%m/%d')
+        add_len = len(day_block) - len(date_block)
+        date_block += ' '*add_len
+        second_line += date_block
+    return [first_line, second_line, '']
+
+def group_header(group_name, foods, estimate=None):
+    """
+    Title and underline of a food group, with the group's
+    cost per store when there is an estimate.
+
+    Returns
+    -------
+    list
+    """
+    #Make the first char upper case.
+    title = group_name[0].upper() + group_name[1:]
+    if estimate:
+        cost_str = estimate.format(estimate.group(foods))
+        if cost_str:
+            title += f' ({cost_str})'
+    return [title, '-'*len(title)]
+
+def cost_lines(estimate):
+    """
+    Total cost lines for the end of a list.
+
+    Returns
+    -------
+    list
+        Empty without an estimate.
+    """
+    if not estimate:
+        return []
+    return [COST_HEADER, '-'*len(COST_HEADER), estimate.format(estimate.total()), '']
+
+def recipe_line(recipe):
+    """
+    Output line for a recipe.
+
+    Returns
+    -------
+    str
+    """
+    batch_str = recipe.batch_str()
+    if batch_str:
+        return f' - {recipe.name} ({batch_str}) - {day_shortstr(recipe.days)}'
+    return f' - {recipe.name} - {day_shortstr(recipe.days)}'
+
+class ListWriter():
+    """
+    Renders a ShoppingResults to a text file in the order of
+    its GroupIndex. Each food and recipe owns one rendered
+    line, patches re-render only the affected line before the
+    file is saved again.
+
+    Parameters
+    ----------
+    results : ShoppingResults
+        The results to render.
+    output_file : Path
+        Path of the text file.
+    subscribe : bool, optional, default=True
+        If true, save the file on every patch.
+    layout : StoreLayout, optional, default=None
+        If provided, groups are written in the store's aisle
+        order, it can be swapped before the next save.
+    """
+
+    def __init__(self, results, output_file, subscribe=True, layout=None):
+        self.results = results
+        self.output_file = output_file
+        self.layout = layout
+        self._recipe_lines = {}
+        self._food_lines = {}
+        self.render()
+        if subscribe:
+            results.subscribe(self.apply)
+
+    def render(self):
+        """Renders every line from the results."""
+        self._recipe_lines = {
+            name:recipe_line(recipe) for name, recipe in self.results.recipes.items()
+        }
+        self._food_lines = {name:str(food) for name, food in self.results.foods.items()}
+
+    def apply(self, patch):
+        """
+        Updates the line for a patch and saves the file.
+
+        Parameters
+        ----------
+        patch : Patch
+            Change published by ShoppingResults.
+        """
+        if patch.kind == 'recipe':
+            lines = self._recipe_lines
+            line = recipe_line(patch.item)
+        else:
+            lines = self._food_lines
+            line = str(patch.item)
+        if patch.op == 'remove':
+            lines.pop(patch.name, None)
+        else:
+            lines[patch.name] = line
+        self.save()
+
+    def lines(self):
+        """
+        Assembles every output line in order.
+
+        Returns
+        -------
+        list
+        """
+        lines = header_lines()
+        lines.append(REC_HEADER)
+        lines.append('-'*len(REC_HEADER))
+        lines.extend(self._recipe_lines.values())
+        lines.append('')
+        groups = self.results.groups
+        estimate = self.results.estimate()
+        for group_name, foods in arrange(groups, self.layout):
+            lines.extend(group_header(group_name, foods, estimate))
+            lines.extend(self._food_lines[food.name] for food in foods)
+            lines.append('')
+        lines.extend(cost_lines(estimate))
+        return lines
+
+    def save(self):
+        """Writes the file."""
+        with open(self.output_file, 'w+', encoding='utf-8') as s_file:
+            s_file.write('\n'.join(self.lines()) + '\n')
+
+def write_bulk(all_results, output_file, master_df, ureg, cur_logger, packages=None,
+        prices=None, layout=None):
+    """
+    Writes one combined bulk purchase list for several
+    households with each household's share under the total.
+
+    Parameters
+    ----------
+    all_results : dict
+        ShoppingResults by household name.
+    output_file : Path
+        Path of the text file.
+    master_df : pd.DataFrame
+        Master food list used for densities.
+    ureg : UnitRegistry
+        The shared unit registry.
+    cur_logger : logging.Logger
+        Logger to report unconvertible amounts to.
+    packages : PackageTable, optional, default=None
+        If provided, the totals are rounded up to whole packages.
+    prices : PriceTable, optional, default=None
+        If provided, group and total costs are included.
+    layout : StoreLayout, optional, default=None
+        If provided, groups are written in aisle order.
+    """
+    contributions = {}
+    for results in all_results.values():
+        for name, food in results.foods.items():
+            contributions.setdefault(name, []).append(food)
+    combined = normalize_foods(contributions, master_df, ureg, cur_logger)
+    if packages is not None:
+        packages.round_up(combined.values())
+    groups = GroupIndex(combined.values())
+    estimate = prices.estimate(combined.values()) if prices else None
+    lines = header_lines()
+    bulk_header = f"Bulk Purchase for {', '.join(all_results)}"
+    lines.append(bulk_header)
+    lines.append('='*len(bulk_header))
+    lines.append('')
+    for group_name, foods in arrange(groups, layout):
+        lines.extend(group_header(group_name, foods, estimate))
+        for food in foods:
+            lines.append(str(food))
+            for household, results in all_results.items():
+                share = results.foods.get(food.name)
+                if share is not None:
+                    lines.append(f'    {household}: {share.amount_str()}')
+        lines.append('')
+    lines.extend(cost_lines(estimate))
+    with open(output_file, 'w+', encoding='utf-8') as s_file:
+        s_file.write('\n'.join(lines) + '\n')
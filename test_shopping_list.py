@@ -1,11 +1,41 @@
 """
 Evaluates the methods in shopping_list
 """
+import datetime as dt
+import logging
+import tempfile
+import threading
 import unittest
+from unittest import mock
+from pathlib import Path
 
 import pandas as pd
+import requests
+from gspread.exceptions import APIError
 
-import shopping_list
+from shopping_list import SHEET_COLS
+from shopping_list.batching import perishable_share, plan_batches, trim_batches
+from shopping_list.builder import (
+    UREG, aggregate_plans, build_food_from_days, create_shopping_list)
+from shopping_list.catalog import Catalog, export_catalog, open_catalog, sync_catalog
+from shopping_list.elements import ChosenItem, Food, Recipe
+from shopping_list.groups import GroupIndex, StoreLayout, arrange, group_order
+from shopping_list.matcher import AlreadyHaveMatcher
+from shopping_list.metrics import BuildMetrics
+from shopping_list.normalize import normalize_group, subtract_on_hand
+from shopping_list.nutrition import NutritionRollup
+from shopping_list.packages import PackageTable
+from shopping_list.pantry import Pantry
+from shopping_list.prices import PriceTable
+from shopping_list.result_cache import load_results, save_results
+from shopping_list.results import ShoppingResults
+from shopping_list.rules import MealRules
+from shopping_list.scheduler import RequestScheduler
+from shopping_list.schema import MASTER_SCHEMA, PLAN_SCHEMA
+from shopping_list.tab_cache import TabCache, read_values
+from shopping_list.trips import TripPlanner, trip_dates
+from shopping_list.workers import ShoppingWorker
+from shopping_list.writer import ListWriter, write_bulk
 
 #pylint: disable=missing-class-docstring,missing-function-docstring
 class TestRoutines(unittest.TestCase):
@@ -18,7 +48,585 @@ class TestRoutines(unittest.TestCase):
             ['What', 'is', 'this'],
             ['Another', 'row', 'of'],
         ]
-        chris_days = {'sunday':pd.DataFrame(chris_sheet)}
-        mel_days = {'monday':pd.DataFrame(mel_sheet)}
+        chris_days = {dt.date(2021, 1, 3):pd.DataFrame(chris_sheet)}
+        mel_days = {dt.date(2021, 1, 4):pd.DataFrame(mel_sheet)}
         user_days = {'chris':chris_days, 'melia':mel_days}
-        shopping_list.build_food_from_days(user_days)
+        items = build_food_from_days(user_days, logging.getLogger(__name__))
+        self.assertEqual(items, {})
+
+class TestSchema(unittest.TestCase):
+
+    def test_header_by_name(self):
+        monday = dt.date(2021, 1, 4)
+        plan = [
+            ['Unit Type', 'Food', 'Qty', 'Serv Weight (g)'],
+            ['servings', 'Eggs', '2', ''],
+            ['grams', 'Rice', '90', '45'],
+            ['servings', 'Lunch', '', ''],
+            ['servings', 'Apple', '1', ''],
+            ['servings', 'Snack', '', ''],
+            ['servings', 'Apple', 'two', ''],
+            ['cups', 'Milk', '1', ''],
+        ]
+        with self.assertLogs(level='WARNING') as logs:
+            items = build_food_from_days(
+                {'chris':{monday:pd.DataFrame(plan)}}, logging.getLogger(__name__))
+        self.assertEqual(sorted(items), ['Eggs', 'Rice'])
+        self.assertEqual(items['Rice'].total_grams(), 90)
+        #One warning per problem column, not per row.
+        self.assertEqual(len(logs.output), 2)
+
+    def test_stream_tabs(self):
+        sunday = dt.date(2021, 1, 3)
+        tabs = (
+            (sheet, sunday, [['Eggs', '2', 'servings']])
+            for sheet in ('chris', 'melia')
+        )
+        items = aggregate_plans(tabs, logging.getLogger(__name__))
+        self.assertEqual(items['Eggs'].total_servings(), 4)
+        self.assertEqual(items['Eggs'].sheets, {'chris', 'melia'})
+
+    def test_meal_rules(self):
+        friday = dt.date(2021, 1, 8)
+        rows = [['Dinner', '', ''], ['Steak', '1', 'servings'], ['Snack', '', ''], ['Apple', '1', 'servings']]
+        rules = MealRules([{'sheet':'Chris', 'day':'Fri', 'meal':'Dinner'}, {'sheet':'Guest'}],
+            ['Lunch', 'Snack', 'Dinner'])
+        tabs = [('chris', friday, rows), ('melia', friday, rows), ('guest', friday, rows)]
+        items = aggregate_plans(tabs, logging.getLogger(__name__), rules=rules)
+        self.assertEqual(items['Steak'].sheets, {'melia'})
+        self.assertEqual(items['Apple'].sheets, {'chris', 'melia'})
+
+    def test_nutrition_rollup(self):
+        sunday = dt.date(2021, 1, 3)
+        monday = dt.date(2021, 1, 4)
+        rice = [''] * 14
+        rice[0], rice[1], rice[2], rice[13] = 'Rice', '90', 'grams', '45'
+        tabs = [
+            ('chris', sunday, [['Eggs', '2', 'servings'], rice]),
+            ('melia', sunday, [['Eggs', '1', 'servings'], ['Toast', '1', 'servings']]),
+            ('chris', monday, [['Eggs', '1', 'servings']]),
+        ]
+        master_df = pd.DataFrame(
+            {'Calories':[70, 200], 'Protein':[6, 4]}, index=['Eggs', 'Rice'])
+        nutrition = NutritionRollup(master_df, ['Calories', 'Protein'])
+        aggregate_plans(tabs, logging.getLogger(__name__), nutrition=nutrition)
+        self.assertEqual(list(nutrition.totals[('chris', sunday)]), [540, 20])
+        self.assertEqual(list(nutrition.by_day()[sunday]), [610, 26])
+        report = nutrition.report()
+        self.assertEqual(report[1], 'Sun 01/03 - Calories 610, Protein 26')
+        self.assertEqual(report[2], '  chris - Calories 540, Protein 20')
+        self.assertEqual(report[-1], 'Not in master list: Toast')
+
+    def test_recipe_nutrition(self):
+        rows = [[''] * 13 for _ in range(2)]
+        rows[0][0], rows[0][5], rows[0][6], rows[0][7] = 'Beef', '4', 'ounce', '113'
+        rows[1][0], rows[1][5], rows[1][6], rows[1][7] = 'Beans', '0.5', 'cup', '130'
+        master_df = MASTER_SCHEMA.load(rows)
+        master_df = master_df.set_index(master_df['name'])
+        master_df['Calories'] = [280.0, 110.0]
+        chili = Recipe('Chili', 0.25, [
+            Food('Beef', 1 * UREG.pound, 'pound', 'meat'),
+            Food('Beans', 260 * UREG.gram, 'cup', 'canned'),
+            Food('Salt', 1 * UREG.teaspoon, 'teaspoon', 'spices'),
+        ])
+        nutrition = NutritionRollup(master_df, ['Calories'], {'Chili':chili}, UREG)
+        sunday = dt.date(2021, 1, 3)
+        nutrition.add_tab('chris', sunday, ['Chili'], [2])
+        #A quarter of 4 servings of beef and 2 of beans per serving.
+        self.assertEqual(list(nutrition.totals[('chris', sunday)]), [670])
+        self.assertEqual(nutrition.report()[-1], 'Recipes missing ingredients: Chili')
+
+    def test_letter_fallback(self):
+        row = [''] * 14
+        row[0], row[1], row[2] = 'Eggs', '2', 'servings'
+        typed = PLAN_SCHEMA.load([row])
+        self.assertEqual(typed['qty'][0], 2.0)
+        self.assertEqual(typed['unit_type'][0], 'servings')
+
+    def test_projected_ranges(self):
+        self.assertEqual(PLAN_SCHEMA.ranges(), ['A:C', 'N:N'])
+        self.assertEqual(MASTER_SCHEMA.ranges(), ['A:A', 'F:H', 'M:M'])
+        rows = PLAN_SCHEMA.assemble([[['Eggs', '2', 'servings'], ['Rice', '90', 'grams']], [[], ['45']]])
+        typed = PLAN_SCHEMA.load(rows)
+        self.assertEqual(list(typed['serv_grams'].fillna(0)), [0, 45])
+        self.assertEqual(list(typed['name']), ['Eggs', 'Rice'])
+
+    def test_moved_columns(self):
+        tab = [
+            ['Qty', 'Unit Type', 'Notes', 'Food'] + [''] * 10 + ['Serv Weight (g)'],
+            ['2', 'servings', 'fresh', 'Eggs'] + [''] * 11,
+            ['90', 'grams', '', 'Rice'] + [''] * 10 + ['45'],
+        ]
+        class Tab():
+            spreadsheet_id = 'plan'
+            id = 7
+            title = 'Mon'
+            def batch_get(self, ranges):
+                values = []
+                for rng in ranges:
+                    first, last = rng.split(':')
+                    if first.isdigit():
+                        values.append(tab[int(first) - 1:int(last)])
+                    else:
+                        values.append([
+                            row[SHEET_COLS[first]:SHEET_COLS[last] + 1] for row in tab])
+                return values
+        with mock.patch('shopping_list.tab_cache.get_scheduler') as scheduler:
+            scheduler.return_value.call.side_effect = lambda func, *args, **kw: func(*args)
+            rows = read_values(Tab(), PLAN_SCHEMA)
+            #The moved columns are read again once, then remembered.
+            self.assertEqual(scheduler.return_value.call.call_count, 2)
+            self.assertEqual(read_values(Tab(), PLAN_SCHEMA), rows)
+            self.assertEqual(scheduler.return_value.call.call_count, 3)
+        typed = PLAN_SCHEMA.load(rows)
+        self.assertEqual(PLAN_SCHEMA.header_ranges(tab), ['A:B', 'D:D', 'O:O'])
+        self.assertEqual(list(typed['name']), ['Eggs', 'Rice'])
+        self.assertEqual(list(typed['qty']), [2, 90])
+        self.assertEqual(list(typed['serv_grams'].fillna(0)), [0, 45])
+
+    def test_interned_names(self):
+        typed = MASTER_SCHEMA.load([['Rice'], ['Rice'], ['Eggs']])
+        self.assertEqual(typed['name'].dtype, 'category')
+        self.assertIs(typed['name'][0], typed['name'][1])
+        self.assertIs(Food('Rice', 1 * UREG.cup, 'cup', 'Grains').food_type,
+            Food('Oats', 1 * UREG.cup, 'cup', 'GRAINS').food_type)
+
+class TestTabCache(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = Path(self._tmp.name)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_lookup_revalidates(self):
+        cache = TabCache(self.cache_dir)
+        key = TabCache.key('sheet', 1)
+        cache.store(key, 'rev:1', [['Eggs', '2']])
+        self.assertEqual(cache.lookup(key, 'rev:1'), [['Eggs', '2']])
+        self.assertIsNone(cache.lookup(key, 'rev:2'))
+        #Index survives a new instance.
+        self.assertEqual(TabCache(self.cache_dir).lookup(key, 'rev:1'), [['Eggs', '2']])
+
+    def test_hits_saved_on_flush(self):
+        cache = TabCache(self.cache_dir)
+        key = TabCache.key('sheet', 1)
+        cache.store(key, 'rev:1', [['Eggs', '2']])
+        saved = cache.index_path.stat().st_mtime_ns
+        for _ in range(5):
+            cache.lookup(key, 'rev:1')
+        self.assertEqual(cache.index_path.stat().st_mtime_ns, saved)
+        cache.flush()
+        used = TabCache(self.cache_dir)._index[key]['used']
+        self.assertEqual(used, cache._index[key]['used'])
+
+    def test_lru_eviction(self):
+        cache = TabCache(self.cache_dir, max_bytes=60)
+        cache.store(TabCache.key('sheet', 1), 'rev:1', [['a'*20]])
+        cache.store(TabCache.key('sheet', 2), 'rev:1', [['b'*20]])
+        cache.lookup(TabCache.key('sheet', 1), 'rev:1')
+        cache.store(TabCache.key('sheet', 3), 'rev:1', [['c'*20]])
+        self.assertIsNotNone(cache.lookup(TabCache.key('sheet', 1), 'rev:1'))
+        self.assertIsNone(cache.lookup(TabCache.key('sheet', 2), 'rev:1'))
+        self.assertEqual(len(list(self.cache_dir.glob('tabs/*.json'))), 3)
+
+    def test_caches_share_index(self):
+        first = TabCache(self.cache_dir)
+        second = TabCache(self.cache_dir)
+        def fill(cache, start):
+            for num in range(start, start + 50):
+                cache.store(TabCache.key('sheet', num), 'rev:1', [[str(num)]])
+        threads = [
+            threading.Thread(target=fill, args=(first, 0)),
+            threading.Thread(target=fill, args=(second, 50)),
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        reopened = TabCache(self.cache_dir)
+        for num in range(100):
+            self.assertEqual(reopened.lookup(TabCache.key('sheet', num), 'rev:1'), [[str(num)]])
+        self.assertEqual(list(self.cache_dir.glob('tabs/*.tmp')), [])
+
+    def test_no_revision_skips_cache(self):
+        reads = []
+        class Tab():
+            id = 1
+            title = 'Mon'
+            def get_all_values(self):
+                reads.append(1)
+                return [['Eggs', str(len(reads))]]
+        class Spreadsheet():
+            id = 'sheet'
+            title = 'Chris'
+        cache = TabCache(self.cache_dir)
+        self.assertEqual(cache.get_values(Spreadsheet(), Tab()), [['Eggs', '1']])
+        self.assertEqual(cache.get_values(Spreadsheet(), Tab()), [['Eggs', '2']])
+        self.assertEqual(len(reads), 2)
+        self.assertEqual(list(self.cache_dir.glob('tabs/*.json')), [])
+
+class TestScheduler(unittest.TestCase):
+
+    @staticmethod
+    def api_error(status):
+        response = requests.Response()
+        response.status_code = status
+        response._content = b'{"error": {"code": %d, "message": "", "status": ""}}' % status
+        return APIError(response)
+
+    def test_retries_rate_limits(self):
+        scheduler = RequestScheduler(per_minute=6000, base_delay=0.001)
+        calls = []
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise self.api_error(429)
+            return 'ok'
+        self.assertEqual(scheduler.call(flaky), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_client_errors_raise(self):
+        scheduler = RequestScheduler(per_minute=6000, base_delay=0.001)
+        calls = []
+        def missing():
+            calls.append(1)
+            raise self.api_error(404)
+        with self.assertRaises(APIError):
+            scheduler.call(missing)
+        self.assertEqual(len(calls), 1)
+
+class TestWorkers(unittest.TestCase):
+
+    def test_failed_build_finishes(self):
+        worker = ShoppingWorker({}, Path('list.txt'), None)
+        emitted = []
+        worker.finished.connect(lambda *args: emitted.append(args))
+        with mock.patch('shopping_list.builder.build', side_effect=RuntimeError('quota')):
+            with self.assertLogs('shopping_list.builder', level='ERROR'):
+                worker.run()
+        self.assertEqual(emitted, [(None, None, None)])
+
+class TestCatalog(unittest.TestCase):
+
+    def test_export_and_map(self):
+        master = [['' for _ in range(13)] for _ in range(3)]
+        for row, (name, qty, unit, grams, f_type) in enumerate([
+                ('Rice', '0.25', 'cup', '45', 'grains'),
+                ('Eggs', '1', 'whole', '50', 'dairy'),
+                ('Apple', 'NA', 'whole', '180', 'produce')]):
+            master[row][0] = name
+            master[row][5] = qty
+            master[row][6] = unit
+            master[row][7] = grams
+            master[row][12] = f_type
+        master_df = MASTER_SCHEMA.load(master)
+        master_df = master_df.set_index(master_df['name'])
+        raw_df = pd.DataFrame(
+            [['Oats', '0.5', 'cup', 'grains']],
+            columns=['Name', 'Serving Qty', 'Serving Unit', 'Food Type'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = export_catalog(master_df, raw_df, Path(tmp_dir) / 'catalog.bin')
+            catalog = Catalog(path)
+            self.assertEqual(catalog.master_row('Eggs').unit, 'whole')
+            self.assertEqual(catalog.master_row('Rice').qty, 0.25)
+            self.assertNotEqual(catalog.master_row('Apple').qty, catalog.master_row('Apple').qty)
+            self.assertIsNone(catalog.master_row('Milk'))
+            self.assertEqual(catalog.base_row('Oats').food_type, 'grains')
+            self.assertIn('Apple', catalog)
+            catalog.close()
+
+    def test_current_catalog_builds_foods(self):
+        master = [[''] * 13 for _ in range(2)]
+        master[0][0], master[0][5], master[0][6], master[0][7], master[0][12] = (
+            'Rice', '0.25', 'cup', '45', 'grains')
+        master[1][0], master[1][5], master[1][6], master[1][7], master[1][12] = (
+            'Eggs', '1', 'whole', '50', 'dairy')
+        master_df = MASTER_SCHEMA.load(master)
+        master_df = master_df.set_index(master_df['name'])
+        raw_df = pd.DataFrame([], columns=['Name', 'Serving Qty', 'Serving Unit', 'Food Type'])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'catalog.bin'
+            self.assertTrue(sync_catalog(master_df, raw_df, 'rev1', path))
+            self.assertFalse(sync_catalog(master_df, raw_df, 'rev1', path))
+            self.assertIsNone(open_catalog('rev2', path))
+            catalog = open_catalog('rev1', path)
+            rice = ChosenItem('Rice')
+            rice.add_servings(2)
+            #An empty frame shows the foods come from the catalog.
+            all_food, _ = create_shopping_list(
+                {'Rice':rice}, master_df.iloc[:0], {}, set(), catalog=catalog)
+            catalog.close()
+        self.assertEqual(str(all_food['Rice']), '0.50 cup Rice ()')
+
+class TestNormalize(unittest.TestCase):
+
+    def test_mixed_units(self):
+        foods = [
+            Food('Rice', 1 * UREG('cup'), 'cup', 'grains'),
+            Food('Rice', 8 * UREG('tablespoon'), 'cup', 'grains'),
+            Food('Rice', 90 * UREG('gram'), 'cup', 'grains'),
+            Food('Rice', 1 * UREG('can'), 'cup', 'grains'),
+        ]
+        density = 180 * UREG.gram / UREG.cup
+        food, bad_units = normalize_group(foods, UREG, lambda: density)
+        self.assertAlmostEqual(food.amount.to('cup').magnitude, 2.0)
+        self.assertEqual(bad_units, ['can'])
+        self.assertEqual(len(food.leftovers), 1)
+
+class TestAlreadyHaveMatcher(unittest.TestCase):
+
+    def test_patterns(self):
+        matcher = AlreadyHaveMatcher(
+            ['Salt', '*spice*', 'category:Spices', '500 g rice', '2 large eggs'], UREG)
+        self.assertIn('salt', matcher)
+        self.assertIn('Pumpkin Spice Mix', matcher)
+        self.assertIn('2 large eggs', matcher)
+        self.assertNotIn('rice', matcher)
+        self.assertTrue(matcher.ignores(Food('Cumin', 1 * UREG('tsp'), 'tsp', 'spices')))
+        self.assertFalse(matcher.ignores(Food('Rice', 1 * UREG('cup'), 'cup', 'grains')))
+
+    def test_subtract_partial(self):
+        matcher = AlreadyHaveMatcher(['500 g rice', '1 kg oats'], UREG)
+        all_food = {
+            'Rice': Food('Rice', 800 * UREG('gram'), 'gram', 'grains'),
+            'Oats': Food('Oats', 200 * UREG('gram'), 'gram', 'grains'),
+        }
+        ignored = {}
+        subtract_on_hand(all_food, ignored, matcher.on_hand(UREG), None, UREG, None)
+        self.assertAlmostEqual(all_food['Rice'].amount.magnitude, 300)
+        self.assertAlmostEqual(ignored['Rice'].amount.magnitude, 500)
+        self.assertNotIn('Oats', all_food)
+        self.assertIn('Oats', ignored)
+
+class TestPantry(unittest.TestCase):
+
+    def test_amounts(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pantry = Pantry(Path(tmp_dir) / 'pantry.db')
+            pantry.set_amount('Rice', 500, 'gram')
+            pantry.set_quantity('rice', 250 * UREG('gram'))
+            pantry.set_amount('Chili', 1, 'recipe')
+            on_hand = pantry.on_hand(UREG)
+            self.assertEqual(on_hand['rice'], 250 * UREG('gram'))
+            self.assertIn('chili', on_hand)
+            pantry.set_amount('Chili', 0, 'recipe')
+            self.assertEqual(pantry.items(), [('rice', 250.0, 'gram')])
+
+class TestListWriter(unittest.TestCase):
+
+    def test_patches(self):
+        results = ShoppingResults(
+            {'Rice': Food('Rice', 1 * UREG('cup'), 'cup', 'grains')},
+            {'Chili': Recipe('Chili', 0.25)})
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_file = Path(tmp_dir) / 'list.txt'
+            ListWriter(results, out_file)
+            results.add_food(Food('Apple', 2 * UREG('whole'), 'whole', ''))
+            results.set_amount('Rice', 3 * UREG('cup'))
+            results.remove_recipe('Chili')
+            lines = out_file.read_text(encoding='utf-8').splitlines()
+        self.assertIn('3.00 cup Rice ()', lines)
+        self.assertEqual(lines[-3:], ['-'*len('No Category'), '2.00 whole Apple ()', ''])
+        self.assertFalse(any('Chili' in line for line in lines))
+
+    def test_bulk(self):
+        chris = ShoppingResults({
+            'Rice': Food('Rice', 1 * UREG('cup'), 'cup', 'grains'),
+            'Apple': Food('Apple', 2 * UREG('whole'), 'whole', 'produce'),
+        })
+        beans = Food('Beans', 2 * UREG('cup'), 'cup', 'canned')
+        beans.leftovers = [1 * UREG('can')]
+        chris.add_food(beans)
+        melia = ShoppingResults({
+            'Rice': Food('Rice', 8 * UREG('tablespoon'), 'cup', 'grains'),
+            'Beans': Food('Beans', 1 * UREG('cup'), 'cup', 'canned'),
+        })
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            out_file = Path(tmp_dir) / 'bulk.txt'
+            write_bulk({'chris':chris, 'melia':melia}, out_file, MASTER_SCHEMA.load([]), UREG,
+                logging.getLogger(__name__))
+            lines = out_file.read_text(encoding='utf-8').splitlines()
+        self.assertIn('Bulk Purchase for chris, melia', lines)
+        rice = lines.index('1.50 cup Rice ()')
+        self.assertEqual(lines[rice + 1:rice + 3], ['    chris: 1.00 cup', '    melia: 0.50 cup'])
+        beans = lines.index('3.00 cup + 1.00 can Beans ()')
+        self.assertEqual(lines[beans + 1:beans + 3],
+            ['    chris: 2.00 cup + 1.00 can', '    melia: 1.00 cup'])
+        apple = lines.index('2.00 whole Apple ()')
+        self.assertEqual(lines[apple + 1:apple + 3], ['    chris: 2.00 whole', ''])
+
+class TestBatching(unittest.TestCase):
+
+    def test_integer_batches(self):
+        #Four servings per batch.
+        _, batches, leftover = plan_batches([4.5, 4, 1, 8.1], [0.25] * 4, tolerance=0.05)
+        self.assertEqual(list(batches), [2, 1, 1, 2])
+        self.assertEqual(list(leftover[:3]), [3.5, 0, 3])
+
+    def test_trim_batches(self):
+        chili = Recipe('Chili', 0.25, [Food('Beef', 1 * UREG.pound, 'pound', 'meat')])
+        tacos = Recipe('Tacos', 0.25, [Food('Beef', 1 * UREG.pound, 'pound', 'meat')])
+        rice = Recipe('Rice Bowl', 0.25, [Food('Rice', 1 * UREG.cup, 'cup', 'grains')])
+        recipes = [chili, tacos, rice]
+        needed, batches, _ = plan_batches([4.4, 6, 4.4], [0.25] * 3)
+        shared = perishable_share(recipes, {'meat'})
+        self.assertEqual(list(shared), [1, 1, 0])
+        trimmed = trim_batches(needed, batches, [0.25] * 3, shared, max_short=0.5)
+        self.assertEqual(list(trimmed), [1, 2, 2])
+
+class TestPackages(unittest.TestCase):
+
+    def test_round_up(self):
+        row = [''] * 13
+        row[0], row[5], row[6], row[7] = 'Black Beans', '0.5', 'cup', '130'
+        master_df = MASTER_SCHEMA.load([row])
+        master_df = master_df.set_index(master_df['name'])
+        table = PackageTable({
+            'Black Beans':{'size':'15.5 ounce', 'unit':'can'},
+            'Rice':{'size':'2 pound', 'unit':'bag'},
+        }, master_df, UREG)
+        beans = Food('Black Beans', 3 * UREG.cup, 'cup', 'canned')
+        rice = Food('Rice', 4.02 * UREG.pound, 'pound', 'grains')
+        apple = Food('Apple', 2 * UREG.whole, 'whole', 'produce')
+        self.assertEqual(table.round_up([beans, rice, apple]), 2)
+        self.assertEqual(beans.packages, (2, 'can'))
+        self.assertEqual(rice.packages, (2, 'bag'))
+        self.assertIsNone(apple.packages)
+        self.assertTrue(str(beans).endswith('- buy 2 can'))
+
+class TestTrips(unittest.TestCase):
+
+    def test_trip_dates(self):
+        days = [dt.date(2021, 1, 3) + dt.timedelta(days=num) for num in range(7)]
+        self.assertEqual(trip_dates(days, ['Wednesday']), [days[0], days[3]])
+        self.assertEqual(trip_dates(days, [days[0], 'Fri']), [days[0], days[5]])
+
+    def test_split(self):
+        days = [dt.date(2021, 1, 3) + dt.timedelta(days=num) for num in range(7)]
+        planner = TripPlanner(days, ['Sunday', 'Wednesday'], {'Meat':3})
+        chicken = Food('Chicken', 4 * UREG.pound, 'pound', 'meat')
+        chicken.days = {days[1], days[2], days[4], days[6]}
+        rice = Food('Rice', 4 * UREG.cup, 'cup', 'grains')
+        rice.days = set(chicken.days)
+        first, second = planner.split({'Chicken':chicken, 'Rice':rice})
+        self.assertAlmostEqual(first['Chicken'].amount.magnitude, 2)
+        self.assertEqual(second['Chicken'].days, {days[4], days[6]})
+        #Foods without a shelf life are all bought on the first trip.
+        self.assertAlmostEqual(first['Rice'].amount.magnitude, 4)
+        self.assertNotIn('Rice', second)
+        self.assertEqual(chicken.amount.magnitude, 4)
+
+    def test_split_leftovers(self):
+        days = [dt.date(2021, 1, 3) + dt.timedelta(days=num) for num in range(7)]
+        planner = TripPlanner(days, ['Wednesday'], {'canned':1})
+        beans = Food('Beans', 2 * UREG.cup, 'cup', 'canned')
+        beans.days = {days[1], days[4]}
+        beans.leftovers = [2 * UREG.can]
+        beans.packages = (2, 'can')
+        first, second = planner.split({'Beans':beans})
+        self.assertEqual(str(first['Beans']), '1.00 cup + 1.00 can Beans (Mon)')
+        self.assertEqual(str(second['Beans']), '1.00 cup + 1.00 can Beans (Thu)')
+        self.assertEqual(beans.leftovers, [2 * UREG.can])
+        self.assertEqual(beans.packages, (2, 'can'))
+        #Foods without days are still copied.
+        rice = Food('Rice', 1 * UREG.cup, 'cup', 'grains')
+        self.assertIsNot(planner.split({'Rice':rice})[0]['Rice'], rice)
+
+class TestPrices(unittest.TestCase):
+
+    def test_estimate(self):
+        table = PriceTable({
+            'Black Beans':{'Aldi':{'price':0.89, 'per':'can'}, 'Kroger':{'price':1.1, 'per':'can'}},
+            'Rice':{'Aldi':{'price':2.0, 'per':'2 pound'}},
+        }, UREG)
+        beans = Food('Black Beans', 3 * UREG.cup, 'cup', 'canned')
+        beans.packages = (2, 'can')
+        rice = Food('Rice', 3 * UREG.pound, 'pound', 'grains')
+        apple = Food('Apple', 2 * UREG.whole, 'whole', 'produce')
+        estimate = table.estimate([beans, rice, apple])
+        self.assertEqual(estimate.stores, ['Aldi', 'Kroger'])
+        self.assertAlmostEqual(estimate.food('Rice')[0], 3.0)
+        self.assertEqual(estimate.format(estimate.group([beans])), 'Aldi $1.78, Kroger $2.20')
+        self.assertEqual(estimate.format(estimate.total()), 'Aldi $4.78, Kroger $2.20')
+        self.assertEqual(estimate.format(estimate.group([apple])), '')
+
+    def test_stores_per_dimension(self):
+        table = PriceTable({
+            'Beans':{'Aldi':{'price':0.89, 'per':'can'}, 'Kroger':{'price':3.0, 'per':'2 pound'}},
+        }, UREG)
+        beans = Food('Beans', 3 * UREG.pound, 'pound', 'canned')
+        with self.assertLogs('shopping_list.prices', level='WARNING') as logs:
+            estimate = table.estimate([beans])
+        self.assertEqual(estimate.format(estimate.food('Beans')), 'Kroger $4.50')
+        self.assertIn('Aldi prices Beans per can', logs.output[0])
+        #Each unusable price is only reported once.
+        with self.assertNoLogs('shopping_list.prices', level='WARNING'):
+            table.estimate([beans])
+        cans = Food('Beans', 2 * UREG.can, 'can', 'canned')
+        self.assertAlmostEqual(table.estimate([cans]).food('Beans')[0], 1.78)
+
+class TestGroupIndex(unittest.TestCase):
+
+    def test_store_layout(self):
+        foods = [
+            Food('Milk', 1 * UREG.cup, 'cup', 'dairy'),
+            Food('Apple', 1 * UREG.whole, 'whole', 'produce'),
+            Food('Peanut Butter', 1 * UREG.cup, 'cup', 'spreads'),
+            Food('Salt', 1 * UREG.cup, 'cup', ''),
+            Food('Bread', 1 * UREG.loaf, 'loaf', 'bakery'),
+        ]
+        index = GroupIndex(foods)
+        layout = StoreLayout('Aldi', ['Produce', 'Dairy', 'Bakery'], {'Peanut Butter':'Bakery'})
+        sections = arrange(index, layout)
+        self.assertEqual([name for name, _ in sections], ['produce', 'dairy', 'bakery', 'No Category'])
+        self.assertEqual([food.name for food in sections[2][1]], ['Bread', 'Peanut Butter'])
+        #The index itself is untouched.
+        self.assertEqual(group_order(index), ['bakery', 'dairy', 'produce', 'spreads', 'No Category'])
+
+    def test_natural_order(self):
+        names = ['egg 10', 'Egg 2', 'apple', 'Banana', 'egg 1']
+        index = GroupIndex(Food(name, 1 * UREG('whole'), 'whole', 'produce') for name in names)
+        index.add(Food('Carrot', 1 * UREG('whole'), 'whole', ''))
+        index.remove(Food('Banana', 1 * UREG('whole'), 'whole', 'produce'))
+        self.assertEqual(
+            [food.name for food in index['produce']],
+            ['apple', 'egg 1', 'Egg 2', 'egg 10'])
+        self.assertEqual(sorted(index), ['No Category', 'produce'])
+
+class TestResultCache(unittest.TestCase):
+
+    def test_round_trip(self):
+        rice = Food('Rice', 2 * UREG('cup'), 'cup', 'grains')
+        rice.days = {dt.date(2024, 1, 1)}
+        rice.leftovers = [1 * UREG('can')]
+        chili = Recipe('Chili', 0.25)
+        chili.days = {dt.date(2024, 1, 2)}
+        results = ShoppingResults({'Rice': rice}, {'Chili': chili}, 100.0)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'last_build.json'
+            save_results(results, path)
+            loaded = load_results(UREG, path)
+        self.assertEqual(loaded.created, 100.0)
+        self.assertEqual(str(loaded.foods['Rice']), str(rice))
+        self.assertEqual(loaded.recipes['Chili'].days, chili.days)
+        self.assertIn('grains', loaded.groups)
+
+class TestMetrics(unittest.TestCase):
+
+    def test_prometheus_text(self):
+        metrics = BuildMetrics()
+        metrics.rows_parsed.inc(12)
+        metrics.master_misses.inc()
+        with metrics.stage('combine'):
+            pass
+        text = metrics.render()
+        self.assertIn('shopping_list_rows_parsed_total 12', text)
+        self.assertIn('shopping_list_master_misses_total 1', text)
+        self.assertIn('shopping_list_stage_seconds_count{stage="combine"} 1', text)
+        self.assertIn('shopping_list_stage_seconds_bucket{stage="combine",le="+Inf"} 1', text)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = Path(tmp_dir) / 'build.prom'
+            metrics.write_textfile(path)
+            self.assertEqual(path.read_text(encoding='utf-8'), text)